@@ -0,0 +1,67 @@
+"""
+Microbenchmark: stocko.packetDecoder (per-field struct.unpack) against
+stocko.decoders (one precompiled struct.Struct per packet type), and
+protlib CStruct.parse against the decoders compiled from the same structs.
+
+    python bench_decoders.py [iterations]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from stocko import decoders, packetDecoder
+from stocko.stockoapi import TICK_DECODERS, TICK_FRAMES
+
+
+def make_packet(packer, mode):
+    # mode and exchange code are signed chars, everything else is unsigned
+    count = len(packer.unpack(bytes(packer.size)))
+    fields = [mode, 2] + [random.randint(0, 2**31) for _ in range(count - 2)]
+    return packer.pack(*fields)
+
+
+def compare(name, old, new, packet, iterations):
+    assert old(packet) == new(packet), f"{name} decoders disagree"
+    t_old = min(timeit.repeat(lambda: old(packet), number=iterations, repeat=3))
+    t_new = min(timeit.repeat(lambda: new(packet), number=iterations, repeat=3))
+    print(
+        f"{name:<16}"
+        f"{t_old / iterations * 1e9:>12.0f} ns"
+        f"{t_new / iterations * 1e9:>9.0f} ns"
+        f"{t_old / t_new:>9.1f}x"
+    )
+
+
+def run(iterations=100_000):
+    cases = [
+        ("marketdata", 1, decoders.DETAILED_MARKETDATA, "decodeDetailedMarketData"),
+        ("compact", 2, decoders.COMPACT_MARKETDATA, "decodeCompactMarketData"),
+        ("snapquote", 4, decoders.SNAPQUOTE, "decodeSnapquoteData"),
+    ]
+    print(f"{'packet':<16}{'packetDecoder':>15}{'decoders':>12}{'speedup':>10}")
+    for name, mode, packer, func in cases:
+        packet = make_packet(packer, mode)
+        old = getattr(packetDecoder, func)
+        new = getattr(decoders, func)
+        compare(name, old, new, packet, iterations)
+
+    # protlib is two orders of magnitude slower, keep its run short
+    print(f"\n{'cstruct':<16}{'protlib':>15}{'compiled':>12}{'speedup':>10}")
+    for mode, cstruct in TICK_FRAMES.items():
+        frame = bytes([mode]) + os.urandom(cstruct.sizeof())
+        compare(
+            cstruct.__name__,
+            lambda frame: cstruct.parse(frame[1:]).__dict__,
+            lambda frame: TICK_DECODERS[mode](frame, 1),
+            frame,
+            max(iterations // 100, 1),
+        )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,368 @@
+"""
+End to end latency of one tick, from the raw frame to the order
+that ChartManager.try_and_trade would submit, stage by stage:
+
+    decode      TICK_DECODERS, or protlib CStruct.parse with --cstruct
+    normalize   the compiled converter AlphaTrade applies to every tick
+    store       Wserver.event_handler_quote_update, tick store and snapshot
+    candle      CandleBuilder.update, underlying only
+    renko       RenkoAtr.update once a candle closes
+    signal      CandleTagger over the candles and bricks
+    order       OptionChain.quote and the bracket order Helper.place_bo builds
+
+Frames are synthetic, the Nifty underlying and an option chain around
+it ticking like stocko.mockfeed, or replayed from a TickRecorder
+directory with --replay. Nothing is sent, the broker is not needed.
+
+p50 and p99 of every stage are printed in microseconds. --check fails
+with exit status 1 when a p99 exceeds BUDGETS, or the p99 saved by an
+earlier --save times --tolerance when --baseline is given, so the
+suite can run in CI.
+
+    python bench_pipeline.py [--frames 200000] [--check]
+    python bench_pipeline.py --replay ../data/ticks --check --baseline base.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from candles import CandleBuilder
+from optionchain import OptionChain
+from renko import CandleTagger, RenkoAtr
+from symbols import Symbols, dct_sym
+from tickstore import TickStore
+from wserver import Wserver
+from stocko.decoders import compile_converter
+from stocko.masters import Instrument
+from stocko.mockfeed import MULTIPLIERS, MockInstrument, frame_encoder
+from stocko.recorder import TickReader
+from stocko.session import LatencyStats
+from stocko.stockoapi import PRICE_FIELDS, TICK_DECODERS, TICK_FRAMES, WsFrameMode
+
+STAGES = ("decode", "normalize", "store", "candle", "renko", "signal", "order")
+# p99 budgets in microseconds, loose enough for a shared CI runner.
+# renko, signal and order are only timed when a candle closes
+BUDGETS = {
+    "decode": 50,
+    "normalize": 25,
+    "store": 150,
+    "candle": 100,
+    "renko": 15000,
+    "signal": 3000,
+    "order": 500,
+    "total": 5000,
+}
+EXCHANGES = {1: "NSE", 2: "NFO", 3: "CDS", 4: "MCX", 6: "BSE", 7: "BFO"}
+BASE = "NIFTY"
+UNDERLYING = (1, int(dct_sym[BASE]["token"]))
+TIMEFRAME = {"5Min": 300}
+# synthetic sessions start here, 2025-01-01 00:00 UTC, on a candle
+# boundary so every run forms the same candles and bricks
+EPOCH = 1_735_689_600
+PERIOD = 11
+
+
+def make_chain(strikes=21, atm=22000):
+    """(strike, option type, Instrument) of strikes calls and puts around atm"""
+    diff = dct_sym[BASE]["diff"]
+    contracts = []
+    for i in range(strikes):
+        strike = atm + (i - strikes // 2) * diff
+        for option_type in ("CE", "PE"):
+            token = len(contracts) + 1
+            symbol = f"{BASE}BENCH{strike}{option_type}"
+            instrument = Instrument("NFO", token, symbol, BASE, None, 75)
+            contracts.append((float(strike), option_type, instrument))
+    return contracts
+
+
+def synthetic(contracts, frames, mode, options=4, seconds_per_candle=30, seed=7):
+    """
+    (received ns, frame) of the underlying followed by options random
+    options from EPOCH on, a 5 minute candle closes every
+    seconds_per_candle underlying ticks so the renko, signal and
+    order stages get exercised
+    """
+    rng = random.Random(seed)
+    encode = frame_encoder(mode)
+    underlying = MockInstrument(*UNDERLYING, 22000 * 100, rng)
+    calls = [
+        MockInstrument(2, instrument.token, rng.randint(50, 300) * 100, rng)
+        for _, _, instrument in contracts
+    ]
+    step = 300 / seconds_per_candle
+    clock = EPOCH - step
+    for i in range(frames):
+        if i % (options + 1) == 0:
+            clock += step
+            source = underlying
+        else:
+            source = rng.choice(calls)
+        yield int(clock * 1e9), encode(source.tick(int(clock)))
+
+
+def recorded(path):
+    """tick frames of a TickRecorder directory or segment"""
+    for received_at, frame in TickReader(path):
+        if not isinstance(frame, str) and frame and frame[0] in TICK_DECODERS:
+            yield received_at, frame
+
+
+class Pipeline:
+    """
+    The path of a tick through the app, without the websocket and the ui
+
+    Parameters
+    ----------
+    contracts : list
+        option chain as make_chain returns it
+    integer_prices : bool
+        keep ticks in paise, what main.INTEGER_PRICES turns on
+    cstruct : bool
+        decode with protlib instead of the compiled decoders
+    """
+
+    def __init__(self, contracts, integer_prices=False, cstruct=False):
+        self.instruments = {
+            (2, instrument.token): instrument for _, _, instrument in contracts
+        }
+        self.underlying = (EXCHANGES[UNDERLYING[0]], UNDERLYING[1])
+        self.instruments[UNDERLYING] = Instrument(
+            "NSE", UNDERLYING[1], dct_sym[BASE]["index"], BASE, None, 1
+        )
+        names = [None] * (max(EXCHANGES) + 1)
+        multipliers = [None] * len(names)
+        for code, name in EXCHANGES.items():
+            names[code], multipliers[code] = name, MULTIPLIERS[code]
+        self.converters = {
+            mode: compile_converter(
+                cstruct_,
+                PRICE_FIELDS,
+                names,
+                multipliers,
+                self.instrument,
+                scale=not integer_prices,
+            )
+            for mode, cstruct_ in TICK_FRAMES.items()
+        }
+        if cstruct:
+            self.decoders = {
+                mode: lambda frame, _, c=c: c.parse(frame[1:]).__dict__
+                for mode, c in TICK_FRAMES.items()
+            }
+        else:
+            self.decoders = TICK_DECODERS
+        # the quote handler only needs the store and the snapshots
+        self.wserver = Wserver.__new__(Wserver)
+        self.wserver.store = TickStore(1024)
+        self.wserver.live_data = {}
+
+        self.multiplier = MULTIPLIERS[UNDERLYING[0]] if integer_prices else 1
+        integer = self.multiplier != 1
+        self.candles = CandleBuilder(TIMEFRAME, dtype=np.int64 if integer else float)
+        self.renko = RenkoAtr(PERIOD, integer=integer)
+        self.tagger = CandleTagger()
+        self.chain = OptionChain(
+            contracts, self.wserver.store, multiplier=self.multiplier
+        )
+        self.symbols = Symbols("NFO", BASE, None)
+        self.counted = 0
+        self.orders = 0
+
+    def instrument(self, code, token):
+        instrument = self.instruments.get((code, token))
+        if instrument is None:
+            # recorded tokens the bench has no contract of
+            instrument = self.instruments[(code, token)] = Instrument(
+                EXCHANGES.get(code), token, str(token), None, None, 1
+            )
+        return instrument
+
+    def seed(self, candles=50, seed=3):
+        """renko history like ChartData gets from Helper.history"""
+        rng = np.random.default_rng(seed)
+        # the session before the synthetic one, in ns like the bricks
+        start = EPOCH - 86400 - candles * 300
+        close = 22000 + np.cumsum(rng.normal(0, 15, candles))
+        rows = []
+        for i, c in enumerate(close):
+            o = c + rng.normal(0, 2)
+            h, l = max(o, c) + rng.uniform(0, 10), min(o, c) - rng.uniform(0, 10)
+            prices = [o, h, l, c]
+            if self.multiplier != 1:
+                prices = [int(round(p * self.multiplier)) for p in prices]
+            rows.append(((start + i * 300) * 10**9, *prices))
+        self.renko.seed(rows)
+
+    def run(self, frames, stats):
+        clock = time.perf_counter_ns
+        for received_at, frame in frames:
+            t0 = clock()
+            mode = frame[0]
+            tick = self.decoders[mode](frame, 1)
+            t1 = clock()
+            tick = self.converters[mode](tick)
+            t2 = clock()
+            self.wserver.event_handler_quote_update(tick)
+            t3 = clock()
+            timings = [("decode", t1 - t0), ("normalize", t2 - t1), ("store", t3 - t2)]
+            ltp = tick.get("ltp")
+            # snapquotes carry no ltp, the chart only follows the underlying,
+            # and a stage is only timed when it does something
+            if ltp is not None and (tick["exchange"], tick["token"]) == self.underlying:
+                closed = self.candles.update(received_at / 1e9, ltp, tick.get("ltq", 0))
+                t4 = clock()
+                timings.append(("candle", t4 - t3))
+                bar = closed.get("5Min")
+                if bar is not None:
+                    timestamp, open, high, low, close, _ = bar
+                    self.renko.update(timestamp * 10**9, open, high, low, close)
+                    t5 = clock()
+                    signal = self.signal()
+                    t6 = clock()
+                    timings += [("renko", t5 - t4), ("signal", t6 - t5)]
+                    if signal:
+                        self.order(signal)
+                        timings.append(("order", clock() - t6))
+            for stage, ns in timings:
+                stats.record(stage, ns / 1e9)
+            stats.record("total", (clock() - t0) / 1e9)
+
+    def signal(self):
+        """direction of the previous candle, like try_and_trade reads it"""
+        view = self.candles["5Min"].view()
+        bricks = self.renko.bricks
+        tags = self.tagger.update(
+            view["timestamp"] * 10**9,
+            [brick.date for brick in bricks],
+            [1 if brick.is_up else -1 for brick in bricks],
+        )
+        counted = len(tags)
+        if counted <= 1 or counted == self.counted:
+            return 0
+        self.counted = counted
+        return int(tags[-2])
+
+    def order(self, signal):
+        close = self.candles["5Min"].last(closed_only=True)[4] / self.multiplier
+        atm = self.symbols.get_atm(close)
+        option = self.chain.quote(atm, "CE" if signal == 1 else "PE")
+        if not option:
+            return None
+        instrument = Instrument(
+            exchange=option["exchange"],
+            token=option["token"],
+            symbol=option["symbol"],
+            name=BASE,
+            expiry=option["expiry_date"],
+            lot_size=75,
+        )
+        self.orders += 1
+        return dict(
+            instrument=instrument,
+            qty=75,
+            price=option["close_price"] + 20,
+            trigger_price=None,
+            stop_loss_value=8,
+            square_off_value=5,
+        )
+
+
+def report(summary):
+    print(f"{'stage':<12}{'count':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+    for stage in (*STAGES, "total"):
+        s = summary.get(stage)
+        if s is None:
+            continue
+        print(
+            f"{stage:<12}{s['count']:>10}"
+            f"{s['p50_ms'] * 1e3:>10.1f}"
+            f"{s['p99_ms'] * 1e3:>10.1f}"
+            f"{s['max_ms'] * 1e3:>10.1f}"
+        )
+
+
+def regressions(summary, baseline=None, tolerance=1.5):
+    """stages whose p99 is over budget, or over tolerance times the baseline"""
+    failed = []
+    for stage, s in summary.items():
+        p99 = s["p99_ms"] * 1e3
+        limit = BUDGETS.get(stage)
+        if baseline is not None and stage in baseline:
+            limit = baseline[stage]["p99_us"] * tolerance
+        if limit is not None and p99 > limit:
+            failed.append(f"{stage} p99 {p99:.1f} us over {limit:.1f} us")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--frames", type=int, default=200_000)
+    parser.add_argument("--replay", help="TickRecorder directory or segment")
+    parser.add_argument(
+        "--mode",
+        type=int,
+        default=int(WsFrameMode.MARKETDATA),
+        choices=[int(WsFrameMode.MARKETDATA), int(WsFrameMode.COMPACT_MARKETDATA)],
+        help="frame mode of the synthetic ticks, those with an ltp",
+    )
+    parser.add_argument("--integer", action="store_true", help="prices in paise")
+    parser.add_argument("--cstruct", action="store_true", help="decode with protlib")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--baseline", help="json written by --save")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--save", help="write the p50 and p99 as json")
+    args = parser.parse_args()
+
+    contracts = make_chain()
+    pipeline = Pipeline(contracts, args.integer, args.cstruct)
+    pipeline.seed()
+    if args.replay:
+        frames = recorded(args.replay)
+    else:
+        frames = synthetic(contracts, args.frames, args.mode)
+    stats = LatencyStats(window=args.frames if not args.replay else 1 << 22)
+    started = time.perf_counter()
+    pipeline.run(frames, stats)
+    elapsed = time.perf_counter() - started
+
+    summary = stats.summary()
+    count = summary.get("total", {}).get("count", 0)
+    print(
+        f"{count} frames in {elapsed:.2f} s, {len(pipeline.renko.bricks)} bricks, "
+        f"{pipeline.orders} orders built"
+    )
+    report(summary)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    stage: dict(p50_us=s["p50_ms"] * 1e3, p99_us=s["p99_ms"] * 1e3)
+                    for stage, s in summary.items()
+                },
+                f,
+                indent=2,
+            )
+    if args.check:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        failed = regressions(summary, baseline, args.tolerance)
+        for line in failed:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
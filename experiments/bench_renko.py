@@ -0,0 +1,111 @@
+"""
+Regression and timing of src/renko.py against stock_indicators.get_renko_atr
+on a seeded random walk of 5 minute candles, and on a walk along a 0.05
+tick grid whose closes land exactly on brick edges.
+
+    python bench_renko.py [candles]
+"""
+
+import os
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from stock_indicators import Quote, indicators
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from renko import RenkoAtr
+
+PERIOD = 11
+
+
+def fixture(n=375, seed=11):
+    rng = np.random.default_rng(seed)
+    close = np.round(22000 + np.cumsum(rng.normal(0, 15, n)), 2)
+    open = np.round(np.r_[close[0], close[:-1]] + rng.normal(0, 2, n), 2)
+    high = np.round(np.maximum(open, close) + rng.uniform(0, 10, n), 2)
+    low = np.round(np.minimum(open, close) - rng.uniform(0, 10, n), 2)
+    return pd.DataFrame(
+        dict(
+            timestamp=pd.date_range("2025-04-01 09:15", periods=n, freq="5min"),
+            open=open,
+            high=high,
+            low=low,
+            close=close,
+        )
+    )
+
+
+def grid_fixture(n=375, seed=11, price=3.5, tick=0.05):
+    """a low priced stock moving whole ticks, closes hit brick edges"""
+    rng = np.random.default_rng(seed)
+    close = np.round(price + np.cumsum(rng.choice([-tick, 0, tick], n)), 2)
+    open = np.round(np.r_[close[0], close[:-1]], 2)
+    high = np.round(np.maximum(open, close) + rng.choice([0, tick, 2 * tick], n), 2)
+    low = np.round(np.minimum(open, close) - rng.choice([0, tick, 2 * tick], n), 2)
+    return pd.DataFrame(
+        dict(
+            timestamp=pd.date_range("2025-04-01 09:15", periods=n, freq="5min"),
+            open=open,
+            high=high,
+            low=low,
+            close=close,
+        )
+    )
+
+
+def reference(df):
+    """what ChartData._calc_atr_renko used to do on every refresh"""
+    quotes = [
+        Quote(
+            date=row["timestamp"],
+            open=Decimal(str(row["open"])),
+            high=Decimal(str(row["high"])),
+            low=Decimal(str(row["low"])),
+            close=Decimal(str(row["close"])),
+        )
+        for _, row in df.iterrows()
+    ]
+    return [
+        (pd.Timestamp(r.date).tz_localize(None), float(r.open), float(r.close))
+        for r in indicators.get_renko_atr(quotes, PERIOD)
+    ]
+
+
+def same(expected, bricks):
+    return len(expected) == len(bricks) and all(
+        e[0] == b.date and abs(e[1] - b.open) < 1e-6 and abs(e[2] - b.close) < 1e-6
+        for e, b in zip(expected, bricks)
+    )
+
+
+def run(n=375):
+    for name, df in (("random walk", fixture(n)), ("tick grid", grid_fixture(n))):
+        print(name)
+        compare(df)
+
+
+def compare(df):
+    n = len(df)
+    rows = list(df.itertuples(index=False, name=None))
+    engine = RenkoAtr(PERIOD)
+    t_old = t_new = 0.0
+    for i, row in enumerate(rows, 1):
+        start = time.perf_counter()
+        engine.update(*row)
+        t_new += time.perf_counter() - start
+        start = time.perf_counter()
+        expected = reference(df.iloc[:i])
+        t_old += time.perf_counter() - start
+        assert same(expected, engine.bricks), f"bricks differ after {i} candles"
+    print(f"{n} candles, {len(engine.bricks)} bricks, identical to get_renko_atr")
+    print(f"{'get_renko_atr per candle':<28}{t_old / n * 1e3:9.3f} ms")
+    print(f"{'RenkoAtr.update per candle':<28}{t_new / n * 1e3:9.3f} ms")
+    print(f"{'speedup':<28}{t_old / t_new:9.0f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 375)
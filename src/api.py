@@ -6,6 +6,7 @@ from constants import O_CNFG
 import sys
 import os
 import pendulum as pdlm
+from datetime import datetime
 import pandas as pd
 from stock_brokers.finvasia.finvasia import Finvasia
 
@@ -15,10 +16,12 @@ from stocko import LiveFeedType, Instrument
 
 
 from wserver import Wserver
+from optionchain import OptionChain
 
 # Add parent directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from stocko.stockoapi import AlphaTrade
+from stocko.orders import OrderGateway
 
 
 def history():
@@ -44,6 +47,9 @@ def history():
             .sort_index(ascending=False)
         )
         df["timestamp"] = pd.to_datetime(df["timestamp"], format="%d-%m-%Y %H:%M:%S")
+        # finvasia sends the prices as strings
+        prices = ["open", "high", "low", "close"]
+        df[prices] = df[prices].astype(float)
         return df
     else:
         print("failed to authenticate finvasia")
@@ -117,20 +123,60 @@ class Helper:
 
     _api = None
     _history = None
+    _orders = None
+    _chains = {}
+    _integer_prices = False
 
     @classmethod
-    def api(cls):
+    def api(cls, integer_prices=False):
+        """integer_prices keeps tick prices in paise, see price_multiplier"""
         if cls._api is None:
             cls._api = login()
-            cls._ws = Wserver(cls._api)
+            cls._integer_prices = integer_prices
+            cls._ws = Wserver(cls._api, integer_prices=integer_prices)
             Token = cls._ws.broker.get_instrument_by_symbol("NSE", "Nifty 50")
             cls._ws.broker.subscribe(Token, LiveFeedType.COMPACT)
+            cls._orders = OrderGateway()
+            cls._ws.order_listeners.append(cls._orders.on_order_update)
+            cls._api.subscribe_order_update()
         return cls._api
 
+    @classmethod
+    def price_multiplier(cls, exchange):
+        """what tick prices of exchange are multiplied by, 1 for rupees"""
+        if not cls._integer_prices:
+            return 1
+        return cls._api.price_multiplier(exchange)
+
     @classmethod
     def ticks(cls):
         return cls._ws.live_data
 
+    @classmethod
+    def tick_history(cls, key, n=None):
+        """last n ticks of key as a (column, tick) view, see tickstore.COLUMNS"""
+        return cls._ws.store[key].last(n)
+
+    @classmethod
+    def option_chain(cls, base, expiry, exchange="NFO"):
+        """chain of base for an expiry like 17APR24 from the master contract"""
+        key = (exchange, base, expiry)
+        if key not in cls._chains:
+            expiry_date = datetime.strptime(expiry, "%d%b%y").date()
+            contracts = cls._api.get_option_contracts(base, expiry_date, exchange)
+            cls._chains[key] = OptionChain(
+                contracts,
+                cls._ws.store,
+                expiry_date,
+                multiplier=cls.price_multiplier(exchange),
+            )
+        return cls._chains[key]
+
+    @classmethod
+    def subscribe(cls, instruments, feed=LiveFeedType.COMPACT):
+        if instruments:
+            cls._ws.broker.subscribe(instruments, feed)
+
     @classmethod
     def history(cls):
         if cls._history is None:
@@ -139,6 +185,7 @@ class Helper:
 
     @classmethod
     def place_bo(cls, **kwargs):
+        """submits a buy bracket order and returns its OrderHandle at once"""
         try:
             inst = Instrument(
                 exchange=kwargs["exchange"],
@@ -149,7 +196,8 @@ class Helper:
                 lot_size=75,
             )
             print(inst)
-            resp = cls._api.buy_bo(
+            resp = cls._orders.submit(
+                cls._api.buy_bo,
                 instrument=inst,
                 qty=75,
                 price=kwargs["close_price"] + 20,
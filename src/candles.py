@@ -0,0 +1,142 @@
+"""
+description:
+    streaming OHLC aggregation, every tick updates
+    only the open candle of each timeframe
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("timestamp", "open", "high", "low", "close", "volume")
+
+
+class CandleSeries:
+    """
+    Append-only OHLC bars of one timeframe
+
+    Buckets are aligned to local midnight like pandas resample,
+    and buckets without ticks are skipped like resample().dropna()
+
+    Parameters
+    ----------
+    seconds : int
+        bar length
+    utc_offset : int
+        seconds east of UTC of the exchange timezone
+    capacity : int
+        initial number of preallocated bars, doubled when full
+    dtype : type
+        of the prices and volume, np.int64 for fixed-point prices
+    """
+
+    def __init__(
+        self, seconds: int, utc_offset: int = 0, capacity: int = 512, dtype=float
+    ):
+        self.seconds = seconds
+        self.utc_offset = utc_offset
+        self.count = 0
+        self._bucket = None
+        self._timestamp = np.zeros(capacity, dtype=np.int64)
+        self._ohlcv = np.zeros((5, capacity), dtype=dtype)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        size = 2 * len(self._timestamp)
+        self._timestamp = np.resize(self._timestamp, size)
+        ohlcv = np.zeros((5, size), dtype=self._ohlcv.dtype)
+        ohlcv[:, : self.count] = self._ohlcv[:, : self.count]
+        self._ohlcv = ohlcv
+
+    def update(self, timestamp: float, price: float, qty: float = 0):
+        """
+        adds a tick with an epoch timestamp in seconds, returns the
+        bar it closed as (timestamp, open, high, low, close, volume)
+        or None while the current bar is still open
+        """
+        bucket = int(timestamp) - (int(timestamp) + self.utc_offset) % self.seconds
+        if bucket == self._bucket:
+            bar = self.count - 1
+            ohlcv = self._ohlcv
+            if price > ohlcv[1, bar]:
+                ohlcv[1, bar] = price
+            elif price < ohlcv[2, bar]:
+                ohlcv[2, bar] = price
+            ohlcv[3, bar] = price
+            ohlcv[4, bar] += qty
+            return None
+
+        if self._bucket is not None and bucket < self._bucket:
+            # late tick from an already closed bar, ignore it
+            return None
+        closed = self.last() if self.count else None
+        if self.count == len(self._timestamp):
+            self._grow()
+        bar = self.count
+        self._timestamp[bar] = bucket
+        self._ohlcv[:, bar] = (price, price, price, price, qty)
+        self._bucket = bucket
+        self.count += 1
+        return closed
+
+    def last(self, closed_only=False):
+        bar = self.count - (2 if closed_only else 1)
+        if bar < 0:
+            return None
+        return (int(self._timestamp[bar]), *self._ohlcv[:, bar].tolist())
+
+    def view(self):
+        """zero-copy numpy views of all bars, the last one may still be open"""
+        n = self.count
+        columns = dict(zip(FIELDS[1:], self._ohlcv[:, :n]))
+        return dict(timestamp=self._timestamp[:n], **columns)
+
+    def to_frame(self, timezone=None, start=0):
+        """bars from position start onwards as a DataFrame"""
+        columns = {k: v[start:] for k, v in self.view().items()}
+        columns["timestamp"] = pd.to_datetime(columns["timestamp"], unit="s", utc=True)
+        if timezone:
+            columns["timestamp"] = columns["timestamp"].tz_convert(timezone)
+        return pd.DataFrame(columns, index=pd.RangeIndex(start, self.count))
+
+
+class CandleBuilder:
+    """
+    Aggregates ticks into several timeframes at once
+
+    Parameters
+    ----------
+    timeframes : dict
+        name to bar length in seconds e.g. {"1Min": 60, "5Min": 300}
+    timezone : str
+        exchange timezone, bars are aligned to its midnight
+    dtype : type
+        of the prices and volume, np.int64 for fixed-point prices
+    """
+
+    def __init__(self, timeframes: dict, timezone: str = "Asia/Kolkata", dtype=float):
+        self.timezone = timezone
+        offset = datetime.now(ZoneInfo(timezone)).utcoffset().total_seconds()
+        self.series = {
+            name: CandleSeries(seconds, int(offset), dtype=dtype)
+            for name, seconds in timeframes.items()
+        }
+
+    def __getitem__(self, name) -> CandleSeries:
+        return self.series[name]
+
+    def update(self, timestamp: float, price: float, qty: float = 0):
+        """returns {timeframe: closed bar} for the bars this tick closed"""
+        closed = {}
+        for name, series in self.series.items():
+            bar = series.update(timestamp, price, qty)
+            if bar is not None:
+                closed[name] = bar
+        return closed
+
+    def to_frame(self, name):
+        return self.series[name].to_frame(self.timezone)
@@ -1,3 +1,6 @@
+import threading
+from collections import namedtuple
+
 import finplot as fplt
 import numpy as np
 import pandas as pd
@@ -12,14 +15,20 @@ from PyQt6.QtGui import QFont
 import pendulum as pdlm
 from api import Helper
 
-from stock_indicators import indicators
-from decimal import Decimal
-from stock_indicators import Quote
-from symbols import Symbols
+from symbols import Symbols, dct_sym
+from candles import CandleBuilder
+from renko import CandleTagger, RenkoAtr
 
 exchange = "NFO"
 base = "NIFTY"
 expiry = "17APR24"
+# True keeps ticks, candles and renko in integer paise, rupees only
+# for the chart, the option chain and orders. Off by default, whole
+# paise brick sizes stop the bricks matching get_renko_atr
+INTEGER_PRICES = False
+
+# what the ui thread needs to draw one frame, built by the worker
+Snapshot = namedtuple("Snapshot", ["version", "candles", "volumes", "price"])
 
 
 class ChartData:
@@ -38,36 +47,54 @@ class ChartData:
         ticks = dict(timestamp=timestamp, ltp=self.ltp)
         return ticks
 
-    def __init__(self):
-        self.df_ticks = None
+    def __init__(self, multiplier=1):
+        # ticks arrive as price * multiplier, integers unless it is 1
+        self.multiplier = multiplier
+        integer = multiplier != 1
+        self.candles = CandleBuilder(
+            {"5Min": 300}, self.timezone, dtype=np.int64 if integer else float
+        )
+        self.renko = RenkoAtr(11, integer=integer)
+        self.renko_df = None
+        self.tagger = CandleTagger()
         self.df_ohlc = None
-
-    def _get_ohlc(self, df_work):
-        df_work.set_index("timestamp", inplace=True)
-        df_candle = df_work["ltp"].resample("5Min").ohlc().dropna()
-        df_candle = df_candle.reset_index()
+        # bumped whenever df_ohlc changes, lets the chart skip redraws
+        self.version = 0
+        self.last_ltp = None
+
+    def _get_ohlc(self):
+        df_candle = self.candles.to_frame("5Min")
+        df_candle = df_candle[["timestamp", "open", "high", "low", "close"]]
+        if self.multiplier != 1:
+            prices = ["open", "high", "low", "close"]
+            df_candle[prices] = df_candle[prices] / self.multiplier
         df_candle["vopen"] = df_candle["vclose"] = df_candle["volume"] = 0
         return df_candle
 
-    def _calc_atr_renko(self, ohlc):
-        df_candle = Helper.history()
-        df_candle["vopen"] = df_candle["vclose"] = df_candle["volume"] = 0
-        ohlc = pd.concat([df_candle, ohlc], ignore_index=True)
-        quotes = [
-            Quote(
-                date=row["timestamp"],
-                open=Decimal(str(row["open"])),
-                high=Decimal(str(row["high"])),
-                low=Decimal(str(row["low"])),
-                close=Decimal(str(row["close"])),
-            )
-            for _, row in ohlc.iterrows()
-        ]
-
-        results = indicators.get_renko_atr(quotes, 11)
+    def _calc_atr_renko(self, bar=None):
+        if self.renko_df is None:
+            df_candle = Helper.history()[["timestamp", "open", "high", "low", "close"]]
+            if self.multiplier != 1:
+                prices = ["open", "high", "low", "close"]
+                df_candle = df_candle.assign(
+                    **{
+                        price: (df_candle[price].astype(float) * self.multiplier)
+                        .round()
+                        .astype(np.int64)
+                        for price in prices
+                    }
+                )
+            self.renko.seed(df_candle.itertuples(index=False, name=None))
+        elif bar is None:
+            return self.renko_df
+        else:
+            timestamp, open, high, low, close, _ = bar
+            date = pd.Timestamp(timestamp, unit="s", tz="UTC")
+            date = date.tz_convert(self.timezone).tz_localize(None)
+            self.renko.update(date, open, high, low, close)
 
         renko_df = pd.DataFrame(
-            [[q.date, q.open, q.close] for q in results],
+            [[q.date, q.open, q.close] for q in self.renko.bricks],
             columns=["date", "vopen", "vclose"],
         ).set_index("date")
 
@@ -77,19 +104,17 @@ class ChartData:
         renko_df.loc[renko_df["vclose"] > renko_df["vopen"], "volume"] = 1
         renko_df.loc[renko_df["vclose"] < renko_df["vopen"], "volume"] = -1
 
+        self.renko_df = renko_df
         return renko_df
 
     def _merge_renko_and_ohlc(
         self, ohlc_df: pd.DataFrame, renko_df: pd.DataFrame
     ) -> pd.DataFrame:
-        for renko_time, renko_volume in renko_df["volume"].items():
-            # Ensure renko_time is a pandas Timestamp with the correct timezone
-            renko_time = pd.Timestamp(renko_time, tz=self.timezone)
-            ohlc_indices_to_update: pd.Index = ohlc_df[
-                ohlc_df["timestamp"] >= renko_time
-            ].index
-            if not ohlc_indices_to_update.empty:
-                ohlc_df.loc[ohlc_indices_to_update[0], "volume"] = renko_volume
+        candle_times = pd.DatetimeIndex(ohlc_df["timestamp"]).as_unit("ns")
+        brick_times = renko_df.index.tz_localize(self.timezone).as_unit("ns")
+        ohlc_df["volume"] = self.tagger.update(
+            candle_times.asi8, brick_times.asi8, renko_df["volume"].to_numpy()
+        )
         return ohlc_df
 
     def update_data(self):
@@ -97,13 +122,13 @@ class ChartData:
         full_tick = Helper.ticks()["NSE|Nifty 50"]
         new_tick = dict(timestamp=timestamp, ltp=full_tick["ltp"])
         # new_tick = self._make_tick()
-        new_df = pd.DataFrame([new_tick])
-        self.df_ticks = pd.concat([self.df_ticks, new_df], ignore_index=True)
-        df_work = self.df_ticks.copy()
-        ohlc = self._get_ohlc(df_work)
-        # todo
-        candle = ohlc.copy()
-        renko_df = self._calc_atr_renko(ohlc)
+        closed = self.candles.update(new_tick["timestamp"].timestamp(), new_tick["ltp"])
+        if not closed and new_tick["ltp"] == self.last_ltp:
+            return
+        self.last_ltp = new_tick["ltp"]
+        candle = self._get_ohlc()
+        # bricks only move when a candle completes
+        renko_df = self._calc_atr_renko(closed.get("5Min"))
         self.df_ohlc = self._merge_renko_and_ohlc(candle, renko_df)
         if self.df_ohlc is not None:
             self.df_ohlc["timestamp"] = (
@@ -111,6 +136,7 @@ class ChartData:
             )
             self.df_ohlc["t"] = range(len(self.df_ohlc))
             self.df_ohlc.set_index("t", inplace=True)
+            self.version += 1
 
     def manage_trades(self):
         pass
@@ -119,47 +145,82 @@ class ChartData:
 class ChartManager:
     signal = 0
     counted = 0
+    missed = 0
 
-    def __init__(self, ax, ax2, price_label):
+    def __init__(self, ax, ax2, price_label, max_rows=300):
         self.ax = ax
         self.ax2 = ax2
-        self.data = ChartData()
+        self.data = ChartData(Helper.price_multiplier("NSE"))
         self.price_label = price_label
         self.underlying_token = Helper._api.get_instrument_by_symbol("NSE", "Nifty 50")
         self.Symbol = Symbols(exchange, base, expiry)
+        self.chain = Helper.option_chain(base, expiry, exchange)
+        self.subscribed = set()
+        # only the last max_rows candles are plotted, so a redraw
+        # costs the same at the end of the day as at the open
+        self.max_rows = max_rows
+        self.candle_plot = None
+        self.volume_plot = None
+        self.drawn_version = None
+        # replaced as a whole by the worker and only read by the ui
+        # timer, swapping the reference is the handoff so no lock
+        self.snapshot = None
+
+    def publish_snapshot(self):
+        """runs on the worker, prepares the plot window for the ui"""
+        if self.snapshot and self.snapshot.version == self.data.version:
+            return
+        df_ohlc = self.data.df_ohlc
+        if df_ohlc is None or df_ohlc.empty:
+            return
+        # positions restart at 0 so every update replaces
+        # the previous window in place
+        plot_df = df_ohlc.iloc[-self.max_rows :].reset_index(drop=True)
+        plot_df["vclose"] = plot_df["volume"]
+        self.snapshot = Snapshot(
+            self.data.version,
+            plot_df[["open", "close", "high", "low"]],
+            plot_df[["vopen", "vclose", "volume"]],
+            plot_df["close"].iloc[-1],
+        )
 
     def update_chart(self):
-        if self.data.df_ohlc is None or self.data.df_ohlc.empty:
+        """runs on the ui timer, draws the latest snapshot if it is new"""
+        snapshot = self.snapshot
+        if snapshot is None:
             print("No OHLC data available for chart")
             return False
 
-        try:
-            # Get plot data
-            plot_df = self.data.df_ohlc.copy()
-
-            # Clear previous data
-            self.ax.reset()
-            self.ax2.reset()
-
-            plot_df["vclose"] = plot_df["volume"]
+        if self.drawn_version == snapshot.version:
+            return True
 
-            # Plot candlestick chart
-            fplt.candlestick_ochl(plot_df[["open", "close", "high", "low"]], ax=self.ax)
-
-            # Plot volume chart
-            fplt.volume_ocv(plot_df[["vopen", "vclose", "volume"]], ax=self.ax2)
+        try:
+            if self.candle_plot is None:
+                # Plot candlestick and volume charts once
+                self.candle_plot = fplt.candlestick_ochl(snapshot.candles, ax=self.ax)
+                self.volume_plot = fplt.volume_ocv(snapshot.volumes, ax=self.ax2)
+                fplt.refresh()
+            else:
+                # and afterwards only push the new window into the same items
+                self.candle_plot.update_data(snapshot.candles)
+                self.volume_plot.update_data(snapshot.volumes)
 
             # Update price label
-            latest_price = plot_df["close"].iloc[-1] if not plot_df.empty else 0
-            self.price_label.setText(f"{latest_price:.2f}")
-
-            # Refresh the plot
-            fplt.refresh()
+            self.price_label.setText(f"{snapshot.price:.2f}")
+            self.drawn_version = snapshot.version
 
         except Exception as e:
             print(f"Error updating chart: {e}")
             return False
 
+    def follow_atm(self, ltp):
+        """keeps depth strikes either side of the money subscribed"""
+        depth = dct_sym[base]["depth"]
+        wanted = set(self.chain.around(ltp, depth)) - self.subscribed
+        if wanted:
+            Helper.subscribe(list(wanted))
+            self.subscribed |= wanted
+
     def try_and_trade(self):
         if self.data.df_ohlc is None or self.data.df_ohlc.empty:
             return
@@ -168,26 +229,38 @@ class ChartManager:
         if counted <= 1:
             return
 
-        option = {}
-        if counted != self.counted:
-            self.counted = counted
-            last = self.data.df_ohlc.iloc[-1]
-            prev = self.data.df_ohlc.iloc[-2]
+        if counted == self.counted:
+            return
+        last = self.data.df_ohlc.iloc[-1]
+        prev = self.data.df_ohlc.iloc[-2]
+        # printed once per candle, not on every retry
+        first = self.missed != counted
+        self.missed = counted
+        if first:
             print(last, prev)
 
-            atm = self.Symbol.get_atm(last["close"])
-            resp = Helper._api.get_optionchain(self.underlying_token, 1, atm)
+        if prev["volume"] == 1:
+            option_type, signal = "CE", 1
+        elif prev["volume"] == -1:
+            option_type, signal = "PE", -1
+        else:
+            self.counted = counted
+            return
 
-            if prev["volume"] == 1:
-                option = self.Symbol.get_atm_strike(resp, expiry, "call_option")
-                self.signal = 1
-            elif prev["volume"] == -1:
-                option = self.Symbol.get_atm_strike(resp, expiry, "put_option")
-                self.signal = -1
+        atm = self.Symbol.get_atm(last["close"])
+        # strikes and live premiums are local, no api call here
+        option = self.chain.quote(atm, option_type)
+        if not option:
+            # not listed or not ticked yet, counted stays so the
+            # next loop tries again
+            if first:
+                print(f"no live quote for {atm} {option_type}, retrying")
+            return
 
-        if option and any(option):
-            print(option)
-            Helper.place_bo(**option)
+        print(option)
+        Helper.place_bo(**option)
+        self.counted = counted
+        self.signal = signal
 
     def check_exit_status(self):
         pass
@@ -195,7 +268,9 @@ class ChartManager:
     def update_loop(self):
         try:
             self.data.update_data()
-            self.update_chart()
+            self.publish_snapshot()
+            if self.data.last_ltp is not None:
+                self.follow_atm(self.data.last_ltp / self.data.multiplier)
             if self.signal == 0:
                 self.try_and_trade()
             else:
@@ -204,9 +279,37 @@ class ChartManager:
             print(f"Error in update loop: {e}")
 
 
+class DataWorker(threading.Thread):
+    """
+    Calls ChartManager.update_loop every interval seconds on its own
+    thread, so ticks, renko, option chains and orders never block the ui
+
+    Parameters
+    ----------
+    manager : ChartManager
+        publishes a Snapshot after every update for the ui timer
+    interval : float
+        seconds between two updates
+    """
+
+    def __init__(self, manager, interval: float = 0.1):
+        super().__init__(name="data-worker", daemon=True)
+        self.manager = manager
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.manager.update_loop()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
 class TradingApp:
     def __init__(self):
-        Helper.api()
+        Helper.api(integer_prices=INTEGER_PRICES)
         self.app = QApplication([])
         self.init_ui()
 
@@ -234,6 +337,7 @@ class TradingApp:
         self.ax.set_visible(True)
 
         self.chart_manager = ChartManager(self.ax, self.ax2, self.price_label)
+        self.worker = DataWorker(self.chart_manager)
 
         self.layout.addWidget(self.ax.vb.win, 0, 0, 1, 1)
         self.layout.addWidget(self.ax2.vb.win, 1, 0, 1, 1)
@@ -241,8 +345,11 @@ class TradingApp:
     def run(self):
         fplt.show(qt_exec=False)
         self.wdw.show()
-        fplt.timer_callback(self.chart_manager.update_loop, 0.1)
+        self.worker.start()
+        # the timer only renders what the worker has published
+        fplt.timer_callback(self.chart_manager.update_chart, 0.1)
         self.app.exec()
+        self.worker.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+"""
+description:
+    option chain of one underlying and expiry built once
+    from the master contract, live prices are read from
+    the tick store so picking a strike needs no api call
+"""
+
+import numpy as np
+
+OPTION_TYPES = ("CE", "PE")
+
+
+class OptionChain:
+    """
+    Calls and puts of one expiry laid out by strike
+
+    Parameters
+    ----------
+    contracts : list
+        (strike, "CE" or "PE", Instrument) sorted by strike,
+        as returned by AlphaTrade.get_option_contracts
+    store : TickStore
+        live ticks keyed like Wserver, "exchange|symbol"
+    expiry : date
+        expiry of the contracts
+    multiplier : int
+        what the stored prices are multiplied by, 100 when the
+        feed keeps integer paise, ltp() always returns rupees
+    """
+
+    def __init__(self, contracts, store=None, expiry=None, multiplier=1):
+        self.store = store
+        self.expiry = expiry
+        self.multiplier = multiplier
+        self.strikes = np.array(sorted({strike for strike, _, _ in contracts}))
+        self._positions = {strike: i for i, strike in enumerate(self.strikes.tolist())}
+        # instruments[option type][strike position], None where not listed
+        self.instruments = [[None] * len(self.strikes) for _ in OPTION_TYPES]
+        for strike, option_type, instrument in contracts:
+            row = self.instruments[OPTION_TYPES.index(option_type)]
+            row[self._positions[strike]] = instrument
+        self.keys = [
+            [None if i is None else f"{i.exchange}|{i.symbol}" for i in row]
+            for row in self.instruments
+        ]
+
+    def __len__(self):
+        return len(self.strikes)
+
+    def position(self, strike):
+        """position of a listed strike, None otherwise"""
+        return self._positions.get(float(strike))
+
+    def nearest(self, price):
+        """position of the strike closest to price"""
+        right = int(np.searchsorted(self.strikes, price))
+        if right == len(self.strikes):
+            return right - 1
+        if right and price - self.strikes[right - 1] <= self.strikes[right] - price:
+            return right - 1
+        return right
+
+    def select(self, price, option_type="CE", offset=0):
+        """
+        position offset strikes away from the money,
+        positive offsets are OTM and negative ones ITM
+        """
+        if not len(self.strikes):
+            return None
+        atm = self.position(price)
+        if atm is None:
+            atm = self.nearest(price)
+        position = atm + offset if option_type == "CE" else atm - offset
+        if 0 <= position < len(self.strikes):
+            return position
+        return None
+
+    def instrument(self, position, option_type="CE"):
+        return self.instruments[OPTION_TYPES.index(option_type)][position]
+
+    def ltp(self, position, option_type="CE"):
+        """last traded price from the tick store, NaN without ticks"""
+        key = self.keys[OPTION_TYPES.index(option_type)][position]
+        buffer = None if self.store is None else self.store.buffers.get(key)
+        if buffer is None:
+            return np.nan
+        return float(buffer.value("ltp")) / self.multiplier
+
+    def prices(self):
+        """(2, strikes) matrix of live ltp, calls then puts"""
+        return np.array(
+            [
+                [self.ltp(i, option_type) for i in range(len(self.strikes))]
+                for option_type in OPTION_TYPES
+            ]
+        )
+
+    def around(self, price, depth):
+        """instruments of the depth strikes on either side of price"""
+        if not len(self.strikes):
+            return []
+        atm = self.nearest(price)
+        return [
+            instrument
+            for row in self.instruments
+            for instrument in row[max(atm - depth, 0) : atm + depth + 1]
+            if instrument is not None
+        ]
+
+    def quote(self, price, option_type="CE", offset=0):
+        """
+        the selected option in the shape Symbols.get_atm_strike returned
+        with close_price being the live ltp, None when it is not listed
+        or has not ticked yet
+        """
+        position = self.select(price, option_type, offset)
+        if position is None:
+            return None
+        instrument = self.instrument(position, option_type)
+        ltp = self.ltp(position, option_type)
+        if instrument is None or np.isnan(ltp):
+            return None
+        return {
+            "expiry_date": self.expiry,
+            "strike_price": float(self.strikes[position]),
+            "option_type": option_type,
+            "token": instrument.token,
+            "exchange": instrument.exchange,
+            "symbol": instrument.symbol,
+            "trading_symbol": instrument.symbol,
+            "close_price": ltp,
+        }
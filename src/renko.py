@@ -0,0 +1,239 @@
+"""
+description:
+    streaming renko bricks sized by a wilder atr,
+    a replacement for stock_indicators.get_renko_atr
+    that consumes one candle at a time
+"""
+
+from collections import namedtuple
+from decimal import ROUND_HALF_EVEN, Decimal
+
+import numpy as np
+
+Brick = namedtuple("Brick", ["date", "open", "close", "is_up"])
+
+
+class WilderAtr:
+    """
+    Average true range with wilder smoothing, seeded by the
+    simple mean of the first `period` true ranges like
+    stock_indicators get_atr (the first candle has no TR)
+    """
+
+    def __init__(self, period: int = 11):
+        self.period = period
+        self.count = 0
+        self.value = None
+        self._sum_tr = 0.0
+        self._prev_close = None
+
+    def update(self, high, low, close):
+        if self._prev_close is not None:
+            prev = self._prev_close
+            tr = max(high - low, abs(high - prev), abs(low - prev))
+            if self.value is not None:
+                self.value = (self.value * (self.period - 1) + tr) / self.period
+            else:
+                self._sum_tr += tr
+                if self.count == self.period:
+                    self.value = self._sum_tr / self.period
+        self._prev_close = close
+        self.count += 1
+        return self.value
+
+
+class RenkoAtr:
+    """
+    Renko bricks (end type close) with the brick size taken from an ATR
+
+    Parameters
+    ----------
+    period : int
+        ATR period
+    trailing : bool
+        True follows get_renko_atr exactly: the brick size is always the
+        latest ATR, so when it changes the stored closes are replayed
+        with the new size and earlier bricks may be redrawn.
+        False locks the brick size at the first ATR (or the ATR after
+        seed()) and only ever appends bricks, O(1) per candle.
+    integer : bool
+        prices are fixed-point integers, e.g. paise. The brick size is
+        rounded to a whole unit so brick prices stay exact integers and
+        the first close is used as it is
+
+    Float prices are stepped in Decimal like get_renko_atr does, so a
+    close landing exactly on a brick edge forms the brick on the same
+    candle. The bricks themselves carry floats.
+    """
+
+    def __init__(self, period: int = 11, trailing: bool = True, integer=False):
+        self.atr = WilderAtr(period)
+        self.trailing = trailing
+        self.integer = integer
+        self.brick_size = None
+        self.bricks = []
+        # position of the first brick added or redrawn by the last update
+        self.changed_from = 0
+        self._dates = []
+        self._closes = []
+        self._upper = self._lower = None
+        # brick_size as the edges are stepped by
+        self._step = None
+
+    def seed(self, candles):
+        """
+        feeds (date, open, high, low, close) history in one pass and sizes
+        the bricks by its ATR, they then equal get_renko_atr(history).
+        Prices may be strings like a broker's candles, they are read as
+        floats, or ints in integer mode
+        """
+        number = int if self.integer else float
+        for date, _, high, low, close in candles:
+            high, low, close = number(high), number(low), number(close)
+            self._dates.append(date)
+            self._closes.append(self._exact(close))
+            self.atr.update(high, low, close)
+        self._rebuild(self._size(self.atr.value))
+        self.changed_from = 0
+        return self.bricks
+
+    def update(self, date, open, high, low, close):
+        """adds one completed candle, returns the bricks added or redrawn"""
+        self._dates.append(date)
+        self._closes.append(self._exact(close))
+        atr = self._size(self.atr.update(high, low, close))
+        if atr is None:
+            self.changed_from = len(self.bricks)
+            return []
+        if self.brick_size is None or (self.trailing and atr != self.brick_size):
+            return self._rebuild(atr)
+        self.changed_from = len(self.bricks)
+        self._add_bricks(date, self._closes[-1])
+        return self.bricks[self.changed_from :]
+
+    def update_tick(self, date, price):
+        """
+        forms bricks from a live price with the current brick size,
+        without touching the ATR or the stored candles
+        """
+        self.changed_from = len(self.bricks)
+        if self.brick_size:
+            self._add_bricks(date, self._exact(price))
+        return self.bricks[self.changed_from :]
+
+    def _size(self, atr):
+        if atr is None or not self.integer:
+            return atr
+        return max(round(atr), 1)
+
+    def _exact(self, price):
+        """price as the edges are computed in, Decimal of its repr for floats"""
+        if self.integer:
+            return price
+        return Decimal(repr(float(price)))
+
+    def _add_bricks(self, date, close):
+        """close as returned by _exact"""
+        size = self._step
+        if close > self._upper:
+            qty = int((close - self._upper) / size)
+            is_up = True
+        elif close < self._lower:
+            qty = int((self._lower - close) / size)
+            is_up = False
+        else:
+            return
+        bricks = self.bricks
+        for _ in range(qty):
+            o = self._upper if is_up else self._lower
+            c = o + size if is_up else o - size
+            if self.integer:
+                bricks.append(Brick(date, o, c, is_up))
+            else:
+                bricks.append(Brick(date, float(o), float(c), is_up))
+            self._upper, self._lower = (c, o) if is_up else (o, c)
+
+    def _rebuild(self, brick_size):
+        previous = self.bricks
+        self.bricks = []
+        self.brick_size = brick_size
+        if not brick_size or not self._closes:
+            self.changed_from = 0
+            return []
+        baseline = self._closes[0]
+        self._step = brick_size
+        if not self.integer:
+            # the size becomes a 15 digit decimal and get_renko_atr
+            # rounds the first close, half to even, to one decimal
+            # place less than the size carries
+            self._step = Decimal(f"{brick_size:.15g}")
+            places = max(-self._step.as_tuple().exponent - 1, 0)
+            baseline = baseline.quantize(Decimal(1).scaleb(-places), ROUND_HALF_EVEN)
+        self._upper = self._lower = baseline
+        for date, close in zip(self._dates[1:], self._closes[1:]):
+            self._add_bricks(date, close)
+        same = 0
+        for old, new in zip(previous, self.bricks):
+            if old != new:
+                break
+            same += 1
+        self.changed_from = same
+        return self.bricks[same:]
+
+
+class CandleTagger:
+    """
+    Marks candles with the direction of renko bricks: a brick lands on the
+    first candle at or after its time, the last brick to land on a candle
+    wins and candles without bricks are 0.
+
+    Times are int64 nanoseconds. Between calls only the candles that a new
+    or redrawn brick can land on are tagged again, as long as candles are
+    only ever appended.
+    """
+
+    def __init__(self):
+        self.tags = np.zeros(0, dtype=np.int64)
+        self._candles = np.zeros(0, dtype=np.int64)
+        self._bricks = np.zeros(0, dtype=np.int64)
+        self._directions = np.zeros(0, dtype=np.int64)
+
+    def update(self, candle_times, brick_times, directions):
+        candle_times = np.asarray(candle_times, dtype=np.int64)
+        brick_times = np.asarray(brick_times, dtype=np.int64)
+        directions = np.asarray(directions, dtype=np.int64)
+        n, old_n = len(candle_times), len(self._candles)
+
+        start = 0
+        if old_n <= n and np.array_equal(candle_times[:old_n], self._candles):
+            # first brick that differs from the previous call
+            m = min(len(brick_times), len(self._bricks))
+            changed = (brick_times[:m] != self._bricks[:m]) | (
+                directions[:m] != self._directions[:m]
+            )
+            first = int(np.argmax(changed)) if changed.any() else m
+            times = np.concatenate(
+                [brick_times[first : first + 1], self._bricks[first : first + 1]]
+            )
+            start = old_n
+            if len(times):
+                start = min(start, int(np.searchsorted(candle_times, times.min())))
+
+        tags = np.zeros(n, dtype=np.int64)
+        tags[:start] = self.tags[:start]
+        j = 0
+        if start:
+            # bricks after the last untouched candle
+            j = np.searchsorted(brick_times, candle_times[start - 1], "right")
+        landing = np.searchsorted(candle_times, brick_times[j:], "left")
+        inside = landing < n
+        landing, moves = landing[inside][::-1], directions[j:][inside][::-1]
+        # reversed, so unique() picks the last brick landing on each candle
+        landing, last = np.unique(landing, return_index=True)
+        tags[landing] = moves[last]
+
+        self.tags = tags
+        self._candles = candle_times
+        self._bricks = brick_times
+        self._directions = directions
+        return tags
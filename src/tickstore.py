@@ -0,0 +1,104 @@
+"""
+description:
+    preallocated numpy ring buffers holding the
+    last N ticks of every subscribed instrument
+"""
+
+import numpy as np
+
+COLUMNS = ("ltp", "ltq", "volume", "bid", "ask", "oi", "timestamp")
+LTP, LTQ, VOLUME, BID, ASK, OI, TIMESTAMP = range(len(COLUMNS))
+
+
+class TickBuffer:
+    """
+    Ring buffer of ticks for one instrument
+
+    Every row is written twice, at i and i + size, so the
+    last n ticks are always one contiguous slice and can
+    be handed out as a view without copying. Rows are
+    float64 so missing fields can be NaN, fixed-point
+    integer prices are still stored exactly
+
+    Parameters
+    ----------
+    size : int
+        number of ticks to keep
+    """
+
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self.count = 0
+        self._pos = 0
+        self._data = np.full((len(COLUMNS), 2 * size), np.nan)
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def append(self, ltp, ltq, volume, bid, ask, oi, timestamp):
+        row = (ltp, ltq, volume, bid, ask, oi, timestamp)
+        pos = self._pos
+        self._data[:, pos] = row
+        self._data[:, pos + self.size] = row
+        self._pos = pos + 1 if pos + 1 < self.size else 0
+        self.count += 1
+
+    def last(self, n=None):
+        """
+        read-only view of the last n ticks, shape (len(COLUMNS), n),
+        oldest first. the view is overwritten as new ticks arrive, so
+        copy it if it has to outlive the next append
+        """
+        n = len(self) if n is None else min(n, len(self))
+        end = self._pos + self.size
+        view = self._data[:, end - n : end]
+        view.flags.writeable = False
+        return view
+
+    def column(self, name, n=None):
+        return self.last(n)[COLUMNS.index(name)]
+
+    def value(self, name):
+        """latest value of one column, NaN before the first tick"""
+        return self._data[COLUMNS.index(name), self._pos + self.size - 1]
+
+    def latest(self):
+        if not self.count:
+            return None
+        row = self._data[:, self._pos + self.size - 1]
+        return dict(zip(COLUMNS, row.tolist()))
+
+
+class TickStore:
+    """
+    One TickBuffer per instrument key, created on the first tick
+    """
+
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self.buffers = {}
+
+    def __contains__(self, key):
+        return key in self.buffers
+
+    def __getitem__(self, key) -> TickBuffer:
+        return self.buffers[key]
+
+    def append(self, key, message):
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = TickBuffer(self.size)
+        bid = message.get("best_bid_price")
+        ask = message.get("best_ask_price")
+        if bid is None and "bid_prices" in message:
+            bid = message["bid_prices"][0]
+            ask = message["ask_prices"][0]
+        buffer.append(
+            message.get("ltp", np.nan),
+            message.get("ltq", np.nan),
+            message.get("volume", np.nan),
+            np.nan if bid is None else bid,
+            np.nan if ask is None else ask,
+            message.get("current_oi", np.nan),
+            message.get("exchange_time_stamp", np.nan),
+        )
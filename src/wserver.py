@@ -9,6 +9,7 @@ import pandas as pd
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from constants import S_DATA
+from tickstore import TickStore
 from stocko import (
     LiveFeedType,
     TransactionType,
@@ -19,65 +20,81 @@ from stocko import (
 warnings.filterwarnings("ignore")
 
 
+# copied into live_data, in this order, when a tick carries them
+SNAPSHOT_FIELDS = (
+    "token",
+    "ltp",
+    "pc",
+    "close",
+    "open",
+    "high",
+    "low",
+    "volume",
+    "ltq",
+    "best_bid_price",
+    "best_ask_price",
+    "atp",
+    "current_oi",
+    "initial_oi",
+    "yearly_high",
+    "yearly_low",
+    "low_dpr",
+    "high_dpr",
+    "multiplier",
+)
+
+
 class Wserver:
     socket_opened = False
-    SYMBOLDICT = {}
-    live_data = {}
     ord_updt = []
 
-    def __init__(self, broker) -> None:
+    def __init__(
+        self,
+        broker,
+        ticks_per_instrument=4096,
+        connect_timeout=30,
+        integer_prices=False,
+    ) -> None:
         self.broker = broker
+        # last N ticks per instrument, live_data keeps the latest snapshot
+        self.store = TickStore(ticks_per_instrument)
+        self.live_data = {}
+        self.SYMBOLDICT = self.live_data
+        # called with every ORDERUPDATE message, e.g. OrderGateway.on_order_update
+        self.order_listeners = []
         self.broker.start_websocket(
             subscribe_callback=self.event_handler_quote_update,
+            order_update_callback=self.order_update_callback,
             socket_open_callback=self.open_callback,
             run_in_background=True,
+            # prices stay integer paise, see Helper.price_multiplier
+            integer_prices=integer_prices,
         )
-        while not self.socket_opened:
-            print("waiting for socket to open")
-            pass
+        print("waiting for socket to open")
+        if not self.broker.wait_for_websocket(connect_timeout):
+            raise TimeoutError(f"websocket did not open in {connect_timeout}s")
         print("Connected to WebSocket...")
         # broker.subscribe(broker.get_instrument_by_symbol('NSE', 'TATASTEEL-EQ'), LiveFeedType.MARKET_DATA)
         # sleep(3)
 
     def event_handler_quote_update(self, inmessage):
-        fields = [
-            "token",
-            "ltp",
-            "pc",
-            "close",
-            "open",
-            "high",
-            "low",
-            "volume",
-            "ltq",
-            "ltp",
-            "best_bid_price",
-            "best_ask_price",
-            "atp",
-            "current_oi",
-            "initial_oi",
-            "yearly_high",
-            "yearly_low",
-            "low_dpr",
-            "high_dpr",
-        ]
-        message = {
-            field: inmessage[field] for field in set(fields) & set(inmessage.keys())
-        }
-
         key = inmessage["exchange"] + "|" + inmessage["instrument"][2]
-        if key in self.SYMBOLDICT:
-            symbol_info = self.SYMBOLDICT[key]
-            symbol_info.update(message)
-            self.SYMBOLDICT[key] = symbol_info
-            self.live_data[key] = symbol_info
-        else:
-            self.SYMBOLDICT[key] = message
-            self.live_data[key] = message
+        self.store.append(key, inmessage)
+        snapshot = self.live_data.get(key)
+        if snapshot is None:
+            snapshot = self.live_data[key] = {}
+        get = inmessage.get
+        # fields a tick does not carry keep their last value
+        for field in SNAPSHOT_FIELDS:
+            value = get(field)
+            if value is not None:
+                snapshot[field] = value
         # print(f"WS quote updated:- \n",live_data)
 
     def order_update_callback(self, msg):
         self.ord_updt = msg
+        for listener in self.order_listeners:
+            listener(msg)
         print("\n WS order update:- \n ", self.ord_updt)
 
     def open_callback(self):
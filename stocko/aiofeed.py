@@ -0,0 +1,250 @@
+"""
+asyncio websocket feed.
+
+One AsyncFeed per account, any number of them on one event loop.
+Frames are read by a reader task into a bounded queue and handed
+to the callbacks (plain functions or coroutines) by a dispatcher
+task, or read with `async for`. A full queue stops the reader, so a
+slow consumer pushes back on the socket instead of growing memory.
+The heartbeat is a task, and the connection is retried with
+exponential backoff and every subscription is sent again on
+reconnect.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import random
+
+import websockets
+
+from stocko.stockoapi import TICK_DECODERS, WsFrameMode
+from stocko.subscriptions import SubscriptionManager
+from stocko.wsstate import ConnectionState
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = json.dumps({"a": "h", "v": [], "m": ""}).encode()
+
+
+class AsyncFeed:
+    """
+    Parameters
+    ----------
+    url : str
+        feed url including login_id and access_token
+    on_tick : callable
+        called with every decoded tick
+    on_order_update : callable
+        called with every ORDERUPDATE message
+    on_message : callable
+        called with (mode, frame) of every other frame
+    transform : callable
+        applied to (mode, tick) of decoded ticks, e.g. price scaling
+    queue_size : int
+        frames buffered between the socket and the dispatcher
+    heartbeat : float
+        seconds between heartbeats
+    backoff : tuple
+        (first, longest) delay in seconds between reconnects
+    """
+
+    def __init__(
+        self,
+        url,
+        on_tick=None,
+        on_order_update=None,
+        on_message=None,
+        transform=None,
+        queue_size: int = 10_000,
+        heartbeat: float = 5,
+        backoff=(0.1, 30),
+    ):
+        self.url = url
+        self.on_tick = on_tick
+        self.on_order_update = on_order_update
+        self.on_message = on_message
+        self.transform = transform
+        self.heartbeat = heartbeat
+        self.backoff = backoff
+        self.state = ConnectionState()
+        self.subscriptions = SubscriptionManager(None, autoflush=False)
+        self.queue_size = queue_size
+        # made on the loop that runs the feed, see _bind
+        self.queue = None
+        self._connected = None
+        self._loop = None
+        self._ws = None
+        self._stopped = False
+        self._flushing = None
+
+    def _bind(self):
+        """creates the queue and the connected event on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self.queue = asyncio.Queue(self.queue_size)
+            self._connected = asyncio.Event()
+
+    # connection
+
+    async def run(self):
+        """reads the feed until close(), dispatching to the callbacks if any"""
+        self._bind()
+        dispatcher = None
+        if self.on_tick or self.on_order_update or self.on_message:
+            dispatcher = asyncio.create_task(self._dispatch())
+        delay = self.backoff[0]
+        try:
+            while not self._stopped:
+                self.state.connecting()
+                try:
+                    async with websockets.connect(self.url, ping_interval=None) as ws:
+                        delay = self.backoff[0]
+                        await self._opened(ws)
+                        beat = asyncio.create_task(self._heartbeat(ws))
+                        try:
+                            async for message in ws:
+                                # blocks while the consumer is behind
+                                await self.queue.put(message)
+                        finally:
+                            beat.cancel()
+                except (
+                    OSError,
+                    asyncio.TimeoutError,
+                    websockets.WebSocketException,
+                ) as e:
+                    logger.warning(f"feed connection lost, {e}")
+                finally:
+                    self._ws = None
+                    self._connected.clear()
+                    self.state.closed()
+                if not self._stopped:
+                    await asyncio.sleep(delay * (1 + random.random() / 2))
+                    delay = min(delay * 2, self.backoff[1])
+        finally:
+            if dispatcher is not None:
+                dispatcher.cancel()
+
+    async def _opened(self, ws):
+        self._ws = ws
+        self.state.opened()
+        self._connected.set()
+        self.subscriptions.resync()
+        await self.flush()
+
+    async def _heartbeat(self, ws):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            await ws.ping(HEARTBEAT)
+
+    async def wait_connected(self, timeout=None):
+        """True once the socket is open, False if timeout seconds pass first"""
+        self._bind()
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self):
+        self._stopped = True
+        if self._ws is not None:
+            await self._ws.close()
+
+    # subscriptions
+
+    def subscribe(self, pairs, mode):
+        """
+        (exchange code, token) pairs, sent with the next flush, or on
+        connect when called before run()
+        """
+        self.subscriptions.subscribe(pairs, mode)
+        self._schedule_flush()
+
+    def unsubscribe(self, pairs, mode):
+        self.subscriptions.unsubscribe(pairs, mode)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._ws is None:
+            # kept pending, _opened sends them once connected
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # called from another thread while the feed runs
+            self._loop.call_soon_threadsafe(self._start_flush)
+            return
+        self._start_flush()
+
+    def _start_flush(self):
+        if self._flushing is None or self._flushing.done():
+            self._flushing = self._loop.create_task(self._later())
+
+    async def _later(self):
+        # coalesce the requests of the same burst
+        await asyncio.sleep(self.subscriptions.window)
+        await self.flush()
+
+    async def flush(self):
+        """sends pending subscriptions, they wait for the connection otherwise"""
+        if self._ws is None:
+            return
+        _, frames = self.subscriptions.drain()
+        for frame in frames:
+            await self._ws.send(frame)
+
+    # frames
+
+    def decode(self, message):
+        """(mode, payload) of one frame"""
+        if isinstance(message, str):
+            return None, message
+        mode = message[0]
+        if mode in TICK_DECODERS:
+            tick = TICK_DECODERS[mode](message, 1)
+            self.subscriptions.on_tick(tick["exchange"], tick["token"])
+            return mode, self.transform(mode, tick) if self.transform else tick
+        if mode == WsFrameMode.ORDERUPDATE:
+            return mode, json.loads(message[5:])
+        return mode, message
+
+    async def _dispatch(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                mode, payload = self.decode(message)
+            except Exception as e:
+                # a bad frame must not end the dispatcher and stall the reader
+                logger.warning(f"feed frame {message[:16]!r} not decoded, {e}")
+                continue
+            if mode in TICK_DECODERS:
+                callback = self.on_tick
+            elif mode == WsFrameMode.ORDERUPDATE:
+                callback = self.on_order_update
+            else:
+                callback = self.on_message
+                payload = (mode, payload)
+            if callback is None:
+                continue
+            try:
+                result = callback(payload)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"feed callback failed, {e}")
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        self._bind()
+        while True:
+            yield self.decode(await self.queue.get())
+
+
+async def run_feeds(*feeds):
+    """runs several feeds on the current loop until all of them close"""
+    await asyncio.gather(*(feed.run() for feed in feeds))
@@ -1,6 +1,6 @@
-import requests
 import json
 from .server import Server
+from .session import HttpSession
 from threading import Thread
 from flask import request
 from .wsclient import socket_connect, get_compact_marketdata, get_detailed_marketdata, get_snapquotedata, send_message, get_ws_connection_status, unsubscribe_update, get_order_update, get_multiple_detailed_marketdata, get_multiple_compact_marketdata, get_multiple_snapquotedata
@@ -12,8 +12,10 @@ import os
 cli = sys.modules['flask.cli']
 cli.show_server_banner = lambda *x: None
 class Connect:
-    def __init__(self, client_id, client_secret, redirect_url, base_url, username, password,totp_secret):
+    def __init__(self, client_id, client_secret, redirect_url, base_url, username, password,totp_secret, pool_size=10, timeout=(3.05, 10)):
         self.headers = {'Content-type': 'application/json'}
+        # pooled keep-alive connections shared by every REST call
+        self.http = HttpSession(pool_size=pool_size, timeout=timeout)
         self.access_token = ""
         self.login_id = ""
         self.base_url=base_url
@@ -76,29 +78,32 @@ class Connect:
     def get_request(self, url, params):
         headers = self.headers
         headers['Authorization'] = f'Bearer {self.access_token}'
-        res = requests.get(f'{self.base_url}{url}' , params=params, headers=headers)
+        res = self.http.get(f'{self.base_url}{url}' , params=params, headers=headers)
         return res.json()
 
     def post_request(self, url, data):
         headers = self.headers
         headers['Authorization'] = f'Bearer {self.access_token}'
-        res = requests.post(f'{self.base_url}{url}', headers=headers, data=json.dumps(data))
+        res = self.http.post(f'{self.base_url}{url}', headers=headers, data=json.dumps(data))
         print(res)
         return res.json()
 
     def put_request(self, url, data):
         headers = self.headers
         headers['Authorization'] = f'Bearer {self.access_token}'
-        res = requests.put(f'{self.base_url}{url}', headers=headers, data=json.dumps(data))
+        res = self.http.put(f'{self.base_url}{url}', headers=headers, data=json.dumps(data))
         print(res)
         return res.json()
 
     def delete_request(self, url, params):
         headers = self.headers
         headers['Authorization'] = f'Bearer {self.access_token}'
-        res = requests.delete(f'{self.base_url}{url}' , params=params, headers=headers)
+        res = self.http.delete(f'{self.base_url}{url}' , params=params, headers=headers)
         return res.json()
 
+    def latency_metrics(self):
+        return self.http.metrics.summary()
+
     def fetch_profile(self, payload):
         params = {'client_id': payload['client_id']}
         res = self.get_request("/api/v1/user/profile", params)
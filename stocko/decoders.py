@@ -0,0 +1,202 @@
+"""
+Precompiled decoders for the binary websocket frames.
+
+Drop-in replacements for the functions in packetDecoder.py: each frame is
+unpacked by a single struct.Struct.unpack_from call instead of one
+struct.unpack and one slice per field. The buffer may be bytes, bytearray,
+memoryview or mmap, and an offset can be given to decode a frame in place
+without copying it out of a larger buffer.
+
+compile_cstruct does the same for the protlib CStruct definitions used by
+AlphaTrade, generating one decoder per struct from its field list, and
+compile_converter generates the matching price scaling and exchange and
+instrument lookup for the decoded ticks.
+"""
+
+import json
+import struct
+
+from stocko.protlib import (
+    BYTE_ORDER,
+    CArray,
+    CError,
+    CString,
+    CStructType,
+    CUnicode,
+    StringTypes,
+)
+
+DETAILED_MARKETDATA = struct.Struct(">bbI8I2Q12I")
+COMPACT_MARKETDATA = struct.Struct(">bbI9I")
+SNAPQUOTE = struct.Struct(">bbI30I5I2QI")
+
+_DETAILED_KEYS = (
+    "mode",
+    "exchange_code",
+    "instrument_token",
+    "last_traded_price",
+    "last_traded_time",
+    "last_traded_quantity",
+    "trade_volume",
+    "best_bid_price",
+    "best_bid_quantity",
+    "best_ask_price",
+    "best_ask_quantity",
+    "total_buy_quantity",
+    "total_sell_quantity",
+    "average_trade_price",
+    "exchange_timestamp",
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "yearly_high_price",
+    "yearly_low_price",
+    "lowDPR",
+    "highDPR",
+    "currentOpenInterest",
+    "initialOpenInterest",
+)
+
+_COMPACT_KEYS = (
+    "mode",
+    "exchange_code",
+    "instrument_token",
+    "last_traded_price",
+    "change",
+    "last_traded_time",
+    "lowDPR",
+    "highDPR",
+    "currentOpenInterest",
+    "initialOpenInterest",
+    "bidPrice",
+    "askPrice",
+)
+
+
+def decodeDetailedMarketData(packet_buffer, offset=0):
+    return dict(
+        zip(_DETAILED_KEYS, DETAILED_MARKETDATA.unpack_from(packet_buffer, offset))
+    )
+
+
+def decodeCompactMarketData(packet_buffer, offset=0):
+    return dict(
+        zip(_COMPACT_KEYS, COMPACT_MARKETDATA.unpack_from(packet_buffer, offset))
+    )
+
+
+def decodeSnapquoteData(packet_buffer, offset=0):
+    v = SNAPQUOTE.unpack_from(packet_buffer, offset)
+    return {
+        "mode": v[0],
+        "exchange_code": v[1],
+        "instrument_token": v[2],
+        "buyers": list(v[3:8]),
+        "bidPrices": list(v[8:13]),
+        "bidQtys": list(v[13:18]),
+        "sellers": list(v[18:23]),
+        "askPrices": list(v[23:28]),
+        "askQtys": list(v[28:33]),
+        "averageTradePrice": v[33],
+        "open": v[34],
+        "high": v[35],
+        "low": v[36],
+        "close": v[37],
+        "totalBuyQty": v[38],
+        "totalSellQty": v[39],
+        "volume": v[40],
+    }
+
+
+def decodeOrderUpdate(packet_buffer, offset=0):
+    return json.loads(bytes(packet_buffer[offset + 5 :]).decode("utf-8"))
+
+
+def compile_cstruct(cstruct):
+    """
+    Generates a decoder for a fixed-size protlib CStruct subclass.
+
+    The struct format is derived once from cstruct.get_fields(), and the
+    returned function parse(buffer, offset=0) unpacks a frame with a single
+    unpack_from call into a dict with the same keys and values as
+    cstruct.parse(buffer[offset:]).__dict__, skipping protlib's BytesIO,
+    per-field parsing and __setattr__ conversion.
+    """
+    items = []
+    index = 0
+    for name, ctype in cstruct.get_fields():
+        if isinstance(ctype.length, StringTypes):
+            raise CError(
+                f"{cstruct.__name__}.{name} is variable-length and cannot be compiled"
+            )
+        if isinstance(ctype, CArray):
+            if isinstance(ctype.ctype, (CArray, CStructType)):
+                raise CError(f"{cstruct.__name__}.{name} is not a flat array")
+            values = ", ".join(f"v[{i}]" for i in range(index, index + ctype.length))
+            items.append(f"{name!r}: [{values}]")
+            index += ctype.length
+        elif isinstance(ctype, (CStructType, CString, CUnicode)):
+            raise CError(f"{cstruct.__name__}.{name} cannot be compiled")
+        else:
+            items.append(f"{name!r}: v[{index}]")
+            index += 1
+
+    packer = struct.Struct(BYTE_ORDER + cstruct.struct_format())
+    source = (
+        "def parse(buffer, offset=0):\n"
+        "    v = unpack_from(buffer, offset)\n"
+        "    return {" + ", ".join(items) + "}\n"
+    )
+    namespace = {"unpack_from": packer.unpack_from}
+    exec(source, namespace)
+    parse = namespace["parse"]
+    parse.__name__ = f"parse_{cstruct.__name__}"
+    parse.__doc__ = f"Compiled decoder for {cstruct.__name__}, {packer.size} bytes"
+    parse.cstruct = cstruct
+    parse.size = packer.size
+    return parse
+
+
+def compile_converter(
+    cstruct, price_fields, exchanges, multipliers, instrument, scale=True
+):
+    """
+    Generates the converter of the ticks a compile_cstruct decoder returns.
+
+    Only the fields of price_fields that cstruct has are scaled, arrays
+    element by element, so a tick costs one statement per price instead
+    of a membership test per known price. exchanges and multipliers are
+    sequences indexed by the exchange code, giving the exchange name and
+    the price divisor, and instrument(code, token) is called once per
+    tick for its "instrument" value. With scale False prices stay the
+    integers of the frame and the divisor is added as "multiplier".
+    """
+    lines = [
+        "def convert(t):",
+        "    code = t['exchange']",
+        "    m = multipliers[code]",
+    ]
+    for name, ctype in cstruct.get_fields():
+        if not scale or name not in price_fields:
+            continue
+        if isinstance(ctype, CArray):
+            lines.append(f"    t[{name!r}] = [p / m for p in t[{name!r}]]")
+        else:
+            lines.append(f"    t[{name!r}] = t[{name!r}] / m")
+    if not scale:
+        lines.append("    t['multiplier'] = m")
+    lines += [
+        "    t['exchange'] = exchanges[code]",
+        "    t['instrument'] = instrument(code, t['token'])",
+        "    return t",
+    ]
+    namespace = {
+        "exchanges": exchanges,
+        "multipliers": multipliers,
+        "instrument": instrument,
+    }
+    exec("\n".join(lines) + "\n", namespace)
+    convert = namespace["convert"]
+    convert.__name__ = f"convert_{cstruct.__name__}"
+    return convert
@@ -0,0 +1,269 @@
+"""
+Frame dispatch between the websocket thread and the callbacks.
+
+The socket thread only puts raw frames into bounded queues, worker
+threads decode and deliver them. Frames are sharded by instrument so
+every token is always handled by the same worker and its ticks stay
+in order. When a queue is full the policy decides what gives:
+
+    block        the socket thread waits, like calling back inline,
+                 the default
+    drop_oldest  the oldest queued tick is discarded
+    drop_newest  the incoming tick is discarded
+    conflate     a queued tick of the same token and mode is replaced
+                 by the newer one, and when full the oldest is dropped
+
+Frames that are not ticks (order updates, market status...) are
+never conflated nor dropped, when the queue is full of them alone
+the socket thread waits whatever the policy.
+"""
+
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("block", "drop_oldest", "drop_newest", "conflate")
+
+
+class FrameQueue:
+    """
+    Bounded FIFO of frames, keyed so that conflation can replace in place
+
+    Parameters
+    ----------
+    maxsize : int
+        frames queued at most
+    policy : str
+        one of POLICIES
+    """
+
+    def __init__(self, maxsize: int = 10_000, policy: str = "block"):
+        if policy not in POLICIES:
+            raise ValueError(f"policy should be one of {POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.enqueued = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.high_water = 0
+        self._frames = OrderedDict()
+        # keys of the queued frames that may not be dropped
+        self._kept = set()
+        self._serial = itertools.count()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, key, frame, droppable=True):
+        """
+        queues frame, key is what conflate replaces a queued frame by,
+        frames that are not droppable are never lost
+        """
+        with self._lock:
+            self.enqueued += 1
+            frames = self._frames
+            if droppable and self.policy == "conflate":
+                if key in frames:
+                    frames[key] = frame
+                    self.conflated += 1
+                    return
+            else:
+                # a queued frame of the same key must not be replaced
+                key = next(self._serial)
+            if len(frames) >= self.maxsize and self.policy != "block":
+                if droppable and self.policy == "drop_newest":
+                    self.dropped += 1
+                    return
+                if self._evict():
+                    self.dropped += 1
+                elif droppable:
+                    # nothing but frames that must be kept, lose this tick
+                    self.dropped += 1
+                    return
+            while len(frames) >= self.maxsize:
+                self._not_full.wait()
+            frames[key] = frame
+            if not droppable:
+                self._kept.add(key)
+            if len(frames) > self.high_water:
+                self.high_water = len(frames)
+            self._not_empty.notify()
+
+    def get(self, timeout=None):
+        """oldest frame, None on timeout"""
+        with self._lock:
+            if not self._frames and not self._not_empty.wait_for(
+                lambda: self._frames, timeout
+            ):
+                return None
+            key, frame = self._frames.popitem(last=False)
+            self._kept.discard(key)
+            self._not_full.notify()
+            return frame
+
+    def _evict(self):
+        """drops the oldest droppable frame, False when there is none"""
+        kept = self._kept
+        for key in self._frames:
+            if key not in kept:
+                del self._frames[key]
+                return True
+        return False
+
+
+class TickDispatcher:
+    """
+    Delivers frames to handler on worker threads
+
+    Parameters
+    ----------
+    handler : callable
+        decodes and delivers one raw frame
+    tick_modes : collection
+        first bytes of the frames that are ticks, conflated per
+        (mode, exchange, token) which are the next five bytes
+    workers : int
+        threads, and queues, frames are sharded over
+    maxsize : int
+        bound of every queue
+    policy : str
+        what to do when a queue is full, see POLICIES
+    """
+
+    def __init__(
+        self,
+        handler,
+        tick_modes,
+        workers: int = 1,
+        maxsize: int = 10_000,
+        policy: str = "block",
+    ):
+        self.handler = handler
+        self.tick_modes = frozenset(tick_modes)
+        self.queues = [FrameQueue(maxsize, policy) for _ in range(workers)]
+        # per worker, so that no lock is needed
+        self.delivered = [0] * workers
+        self.__threads = []
+        self.__stopped = threading.Event()
+
+    def start(self):
+        for i, queue in enumerate(self.queues):
+            thread = threading.Thread(
+                target=self.__work, args=(i, queue), name=f"dispatch-{i}", daemon=True
+            )
+            thread.start()
+            self.__threads.append(thread)
+        return self
+
+    def stop(self):
+        self.__stopped.set()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def put(self, frame):
+        """called on the socket thread, never decodes"""
+        if (
+            isinstance(frame, (bytes, bytearray))
+            and frame[:1]
+            and frame[0] in self.tick_modes
+        ):
+            key = bytes(frame[:6])
+            self.queues[hash(key[1:]) % len(self.queues)].put(key, frame)
+        else:
+            self.queues[0].put(None, frame, droppable=False)
+
+    def __work(self, i, queue):
+        while not self.__stopped.is_set():
+            frame = queue.get(timeout=0.5)
+            if frame is None:
+                continue
+            try:
+                self.handler(frame)
+            except Exception as e:
+                logger.warning(f"tick handler failed, {e}")
+            self.delivered[i] += 1
+
+    def stats(self):
+        """queue depth and counters summed over the queues"""
+        queues = self.queues
+        return dict(
+            depth=sum(len(q) for q in queues),
+            high_water=max(q.high_water for q in queues),
+            enqueued=sum(q.enqueued for q in queues),
+            delivered=sum(self.delivered),
+            dropped=sum(q.dropped for q in queues),
+            conflated=sum(q.conflated for q in queues),
+        )
+
+
+class LatestTicks:
+    """
+    Newest raw tick frame per (exchange, token), decoded when read
+
+    The socket thread only stores the frame, overwriting the one the
+    consumer has not read yet, so on busy instruments most frames are
+    never decoded at all.
+
+    Parameters
+    ----------
+    decode : callable
+        turns one raw tick frame into the tick handed to the consumer
+    """
+
+    def __init__(self, decode):
+        self.decode = decode
+        self.received = 0
+        self.overwritten = 0
+        self.decoded = 0
+        self.__fresh = {}
+        # {(exchange, token): (frame, tick)} of the last frame decoded
+        self.__last = {}
+        self.__lock = threading.Lock()
+
+    def put(self, frame):
+        key = (frame[1], int.from_bytes(frame[2:6], "big"))
+        with self.__lock:
+            self.received += 1
+            if key in self.__fresh:
+                self.overwritten += 1
+            self.__fresh[key] = frame
+
+    def __decode(self, key, frame):
+        last = self.__last.get(key)
+        if last is not None and last[0] is frame:
+            return last[1]
+        tick = self.decode(frame)
+        self.decoded += 1
+        self.__last[key] = (frame, tick)
+        return tick
+
+    def poll(self):
+        """{(exchange, token): tick} of what changed since the last poll"""
+        with self.__lock:
+            fresh, self.__fresh = self.__fresh, {}
+        return {key: self.__decode(key, frame) for key, frame in fresh.items()}
+
+    def get(self, exchange, token):
+        """latest tick of one instrument, None before its first frame"""
+        key = (exchange, int(token))
+        with self.__lock:
+            frame = self.__fresh.get(key)
+        if frame is None:
+            last = self.__last.get(key)
+            return None if last is None else last[1]
+        return self.__decode(key, frame)
+
+    def stats(self):
+        return dict(
+            received=self.received,
+            overwritten=self.overwritten,
+            decoded=self.decoded,
+            pending=len(self.__fresh),
+        )
@@ -0,0 +1,261 @@
+"""
+Master contract store.
+
+Stocko_instruments.csv is parsed in a single pass for every exchange
+and the resulting token and symbol maps are pickled per exchange into
+an index next to the csv as plain columns, so a warm start only
+unpickles the exchanges it needs and builds two dicts for each
+instead of parsing the csv again.
+"""
+
+import csv
+import os
+import pickle
+from bisect import bisect_left
+from collections import namedtuple
+from collections.abc import Mapping
+from datetime import datetime
+
+Instrument = namedtuple(
+    "Instrument", ["exchange", "token", "symbol", "name", "expiry", "lot_size"]
+)
+
+MASTER_CSV = "Stocko_instruments.csv"
+# bump when Instrument or the index layout changes
+INDEX_VERSION = 1
+# Instrument fields after exchange, stored column by column
+TOKEN, SYMBOL, NAME, EXPIRY, LOT_SIZE = range(5)
+
+
+def index_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".idx"
+
+
+def _source(csv_path):
+    stat = os.stat(csv_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ContractMap(Mapping):
+    """
+    Read-only token or symbol to Instrument map of one exchange
+
+    Only the key to row dict is built up front, an Instrument
+    is created from the columns the first time it is asked for
+    and shared with the other map of the same exchange
+
+    Parameters
+    ----------
+    exchange : str
+    columns : tuple
+        lists of token, symbol, name, expiry and lot_size, one row per contract
+    key : int
+        column the map is keyed by, TOKEN or SYMBOL
+    cache : list
+        one slot per row, shared by the maps of the exchange
+    """
+
+    def __init__(self, exchange, columns, key, cache):
+        self.exchange = exchange
+        self._columns = columns
+        self._cache = cache
+        self._rows = dict(zip(columns[key], range(len(cache))))
+
+    def __getitem__(self, key):
+        return self.instrument(self._rows[key])
+
+    def instrument(self, row):
+        instrument = self._cache[row]
+        if instrument is None:
+            instrument = self._cache[row] = Instrument(
+                self.exchange, *(column[row] for column in self._columns)
+            )
+        return instrument
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def rows(self):
+        """row of every key, in key order"""
+        return self._rows.values()
+
+    def column(self, field):
+        return self._columns[field]
+
+
+class SymbolIndex:
+    """
+    Secondary indexes over the contracts of one exchange
+
+    Trading symbols look like "NIFTY 25APR24 22000.0 CE" or
+    "NIFTY 25APR24 FUT", so contracts are grouped by their lowercased
+    first word for searching and keyed by (underlying, expiry, strike,
+    option type) for exact F&O lookups, strike is None for futures,
+    and the option keys of every (underlying, expiry) are kept together
+    to build option chains
+
+    Parameters
+    ----------
+    contracts : ContractMap
+        the by token map of the exchange
+    """
+
+    def __init__(self, contracts: ContractMap):
+        self.contracts = contracts
+        self.groups = {}
+        self.derivatives = {}
+        self.chains = {}
+        symbols = contracts.column(SYMBOL)
+        expiries = contracts.column(EXPIRY)
+        for row in contracts.rows():
+            symbol = symbols[row]
+            parts = symbol.split(" ")
+            self.groups.setdefault(parts[0].lower(), []).append(row)
+            if parts[-1] in ("CE", "PE"):
+                try:
+                    strike = float(parts[-2])
+                except (IndexError, ValueError):
+                    continue
+                key = (parts[0], expiries[row], strike, parts[-1])
+            elif "FUT" in symbol:
+                key = (parts[0], expiries[row], None, "FUT")
+            else:
+                continue
+            # the first contract wins, like the scan it replaces
+            if key not in self.derivatives:
+                self.derivatives[key] = row
+                if key[2] is not None:
+                    self.chains.setdefault(key[:2], []).append(key)
+        # sorted underlyings for prefix searches
+        self.names = sorted(self.groups)
+
+    def get(self, underlying, expiry, strike=None, option_type="FUT"):
+        """the future (strike None) or CE/PE option, None when not listed"""
+        if strike is not None:
+            strike = float(strike)
+        row = self.derivatives.get((underlying, expiry, strike, option_type))
+        return None if row is None else self.contracts.instrument(row)
+
+    def options(self, underlying, expiry):
+        """[(strike, "CE" or "PE", Instrument)] of one expiry sorted by strike"""
+        keys = sorted(self.chains.get((underlying, expiry), ()), key=lambda k: k[2:])
+        return [
+            (k[2], k[3], self.contracts.instrument(self.derivatives[k])) for k in keys
+        ]
+
+    def _names(self, text, prefix):
+        if prefix:
+            start = bisect_left(self.names, text)
+            end = bisect_left(self.names, text + "\U0010ffff")
+            return self.names[start:end]
+        # substring match, but over the distinct underlyings only
+        return [name for name in self.names if text in name]
+
+    def search(self, terms, prefix=False):
+        """
+        contracts whose underlying contains (or with prefix, starts with)
+        any of the terms ignoring case, in master contract order and once
+        per matching term
+        """
+        rows = sorted(
+            (row, i)
+            for i, term in enumerate(terms)
+            for name in self._names(term.lower(), prefix)
+            for row in self.groups[name]
+        )
+        return [self.contracts.instrument(row) for row, _ in rows]
+
+
+def _maps(exchange, columns):
+    """(by_token, by_symbol) over the columns of one exchange"""
+    cache = [None] * len(columns[TOKEN])
+    return (
+        ContractMap(exchange, columns, TOKEN, cache),
+        ContractMap(exchange, columns, SYMBOL, cache),
+    )
+
+
+def parse_master(csv_path):
+    """
+    reads the csv once, returns {exchange: columns}
+    """
+    contracts = {}
+    expiries = {"": None}
+    with open(csv_path, "r", newline="") as file:
+        reader = csv.reader(file)
+        column = {name: i for i, name in enumerate(next(reader))}
+        exch, token, symbol, company, expiry, lot_size = (
+            column[name]
+            for name in (
+                "exchange",
+                "exchange_token",
+                "trading_symbol",
+                "company_name",
+                "expiry",
+                "lot_size",
+            )
+        )
+        for row in reader:
+            columns = contracts.get(row[exch])
+            if columns is None:
+                columns = contracts[row[exch]] = ([], [], [], [], [])
+            # a few dozen distinct expiries across the whole file
+            date = expiries.get(row[expiry], False)
+            if date is False:
+                date = datetime.strptime(row[expiry], "%d-%b-%Y").date()
+                expiries[row[expiry]] = date
+            columns[TOKEN].append(int(row[token]))
+            columns[SYMBOL].append(row[symbol])
+            columns[NAME].append(row[company])
+            columns[EXPIRY].append(date)
+            columns[LOT_SIZE].append(int(row[lot_size]) if row[lot_size] else 0)
+    return contracts
+
+
+def build_index(csv_path):
+    """parses the csv and writes its index, returns {exchange: columns}"""
+    contracts = parse_master(csv_path)
+    index = dict(
+        version=INDEX_VERSION,
+        source=_source(csv_path),
+        exchanges={
+            exchange: pickle.dumps(columns, pickle.HIGHEST_PROTOCOL)
+            for exchange, columns in contracts.items()
+        },
+    )
+    path = index_path(csv_path)
+    with open(path + ".tmp", "wb") as file:
+        pickle.dump(index, file, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+    return contracts
+
+
+def load_master(csv_path, exchanges):
+    """
+    {exchange: (by_token, by_symbol)} of the requested exchanges,
+    from the index when it was built from this very csv, otherwise
+    the index is rebuilt first
+    """
+    try:
+        with open(index_path(csv_path), "rb") as file:
+            index = pickle.load(file)
+        if index["version"] != INDEX_VERSION or index["source"] != _source(csv_path):
+            raise ValueError("stale index")
+        contracts = {
+            exchange: pickle.loads(index["exchanges"][exchange])
+            for exchange in exchanges
+            if exchange in index["exchanges"]
+        }
+    except (OSError, EOFError, KeyError, ValueError, pickle.UnpicklingError):
+        contracts = build_index(csv_path)
+    empty = ([], [], [], [], [])
+    return {
+        exchange: _maps(exchange, contracts.get(exchange, empty))
+        for exchange in exchanges
+    }
@@ -0,0 +1,437 @@
+"""
+Local stand-in for the Stocko REST api.
+
+Serves the routes AlphaTrade uses for orders (place, bracket,
+basket, modify, cancel), the order, trade and position books,
+order history, the option chain and charts/tdv candles, keeping
+its own order book. Every request can be delayed and a share of
+them answered with an error, so the order pipeline, its retries
+and its fallbacks can be load-tested offline.
+
+    python -m stocko.mockbroker --port 8766 --latency 0.02 --error-rate 0.05
+
+and AlphaTrade(..., base_url="http://127.0.0.1:8766"). Given a
+MockFeedServer, order changes are pushed as ORDERUPDATE frames too.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+ROUTES = [
+    ("POST", r"/api/v1/orders", "place_order"),
+    ("POST", r"/api/v1/orders/bracket", "place_bracket_order"),
+    ("POST", r"/api/v2/basketorder", "place_basket_order"),
+    ("PUT", r"/api/v1/orders", "modify_order"),
+    ("DELETE", r"/api/v1/orders/(?P<oms_order_id>[^/]+)", "cancelNormalOrder"),
+    ("DELETE", r"/v1/orders/bracket", "exitBracketOrder"),
+    ("DELETE", r"/v1/orders/cover", "exitCoverOrder"),
+    ("GET", r"/api/v1/orders", "order_book"),
+    ("GET", r"/api/v1/trades", "trade_book"),
+    ("GET", r"/api/v1/positions", "positionBook"),
+    ("GET", r"/api/v1/order/(?P<oms_order_id>[^/]+)/history", "orderHistory"),
+    ("GET", r"/api/v1/optionchain/(?P<exchange>[^/]+)", "optionchain"),
+    ("GET", r"/api/v1/charts/tdv", "charts"),
+]
+ROUTES = [(method, re.compile(path + "$"), name) for method, path, name in ROUTES]
+PENDING = ("open", "trigger pending")
+
+
+def success(data):
+    return {"status": "success", "message": "", "data": data}
+
+
+def failure(message):
+    return {"status": "error", "message": message, "data": {}}
+
+
+class MockBroker:
+    """
+    Order book and http server answering like the Stocko api
+
+    Parameters
+    ----------
+    host, port : str, int
+        where to listen, port 0 picks a free one
+    latency : float
+        seconds every request is held before it is answered
+    jitter : float
+        up to this many seconds are added at random
+    error_rate : float
+        share of requests answered with error_status
+    error_status : int
+        http status of injected errors
+    fill_market : bool
+        MARKET orders complete at once, LIMIT ones stay open
+    feed : MockFeedServer
+        gets an ORDERUPDATE for every order change
+    seed : int
+        of the latency jitter, errors and candles
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=8766,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        error_status: int = 503,
+        fill_market=True,
+        feed=None,
+        seed=None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fill_market = fill_market
+        self.feed = feed
+        self.rng = random.Random(seed)
+        self.orders = {}
+        self.history = {}
+        self.trades = []
+        self.requests = {}
+        self.errors = 0
+        self._fail_next = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    # lifecycle
+
+    def start(self):
+        """serves on a background thread, returns the base url"""
+        broker = self
+
+        class Handler(_Handler):
+            mock = broker
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mockbroker", daemon=True
+        )
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail_next(self, count=1, status=None):
+        """answers the next count requests with an error"""
+        with self._lock:
+            self._fail_next.extend([status or self.error_status] * count)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                requests=dict(self.requests),
+                errors=self.errors,
+                orders=len(self.orders),
+                trades=len(self.trades),
+            )
+
+    # request handling
+
+    def handle(self, method, path, query, body):
+        """(http status, json body) of one request"""
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(path) if route_method == method else None
+            if match:
+                break
+        else:
+            return 404, failure(f"no route for {method} {path}")
+
+        delay = self.latency + (self.rng.random() * self.jitter if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+            if self._fail_next:
+                status = self._fail_next.pop(0)
+            elif self.error_rate and self.rng.random() < self.error_rate:
+                status = self.error_status
+            else:
+                status = None
+            if status is not None:
+                self.errors += 1
+        if status is not None:
+            return status, failure("injected error")
+        params = {k: v[-1] for k, v in query.items()}
+        params.update(match.groupdict())
+        return getattr(self, "_" + name)(params, body)
+
+    # orders
+
+    def _new_order(self, order, product=None):
+        with self._lock:
+            oms_order_id = str(next(self._ids))
+        order = dict(order)
+        order["oms_order_id"] = oms_order_id
+        if product:
+            order["product"] = product
+        if product == "BO":
+            order["leg_order_indicator"] = f"{oms_order_id}-1"
+        order["order_status"] = "open"
+        order["order_entry_time"] = int(time.time())
+        with self._lock:
+            self.orders[oms_order_id] = order
+        self._changed(order)
+        if self.fill_market and order.get("order_type") == "MARKET":
+            self._fill(order)
+        return oms_order_id
+
+    def _changed(self, order):
+        with self._lock:
+            self.history.setdefault(order["oms_order_id"], []).append(dict(order))
+        if self.feed is not None:
+            self.feed.order_update(order)
+
+    def _fill(self, order):
+        with self._lock:
+            order["order_status"] = "complete"
+            self.trades.append(
+                {
+                    "oms_order_id": order["oms_order_id"],
+                    "exchange": order.get("exchange"),
+                    "instrument_token": order.get("instrument_token"),
+                    "order_side": order.get("order_side"),
+                    "filled_quantity": order.get("quantity"),
+                    "trade_price": order.get("price"),
+                    "trade_time": int(time.time()),
+                }
+            )
+        self._changed(order)
+
+    def _place_order(self, params, body):
+        return 200, success({"oms_order_id": self._new_order(body)})
+
+    def _place_bracket_order(self, params, body):
+        return 200, success({"oms_order_id": self._new_order(body, "BO")})
+
+    def _place_basket_order(self, params, body):
+        legs = [
+            {"oms_order_id": self._new_order(order)} for order in body.get("orders", [])
+        ]
+        return 200, success({"orders": legs})
+
+    def _modify_order(self, params, body):
+        with self._lock:
+            order = self.orders.get(str(body.get("oms_order_id")))
+            if order is None or order["order_status"] not in PENDING:
+                return 400, failure("order not found or not pending")
+            order.update({k: v for k, v in body.items() if v is not None})
+        self._changed(order)
+        return 200, success({"oms_order_id": order["oms_order_id"]})
+
+    def _cancel(self, oms_order_id):
+        with self._lock:
+            order = self.orders.get(str(oms_order_id))
+            if order is None or order["order_status"] not in PENDING:
+                return 400, failure("order not found or not pending")
+            order["order_status"] = "cancelled"
+        self._changed(order)
+        return 200, success({"oms_order_id": order["oms_order_id"]})
+
+    def _cancelNormalOrder(self, params, body):
+        return self._cancel(params["oms_order_id"])
+
+    def _exitBracketOrder(self, params, body):
+        return self._exit_product("BO", params)
+
+    def _exitCoverOrder(self, params, body):
+        return self._exit_product("CO", params)
+
+    def _exit_product(self, product, params):
+        """exits the order the query names, like the broker never guesses"""
+        oms_order_id = params.get("oms_order_id")
+        if not oms_order_id:
+            return 400, failure("oms_order_id is required")
+        with self._lock:
+            order = self.orders.get(oms_order_id)
+        if order is None or order.get("product") != product:
+            return 400, failure(f"no {product} order {oms_order_id}")
+        return self._cancel(oms_order_id)
+
+    # books
+
+    def _order_book(self, params, body):
+        pending = params.get("type", "pending") == "pending"
+        with self._lock:
+            orders = [
+                dict(order)
+                for order in self.orders.values()
+                if (order["order_status"] in PENDING) == pending
+            ]
+        key = "pending_orders" if pending else "completed_orders"
+        return 200, success({key: orders})
+
+    def _trade_book(self, params, body):
+        with self._lock:
+            return 200, success({"trades": list(self.trades)})
+
+    def _positionBook(self, params, body):
+        positions = {}
+        with self._lock:
+            trades = list(self.trades)
+        for trade in trades:
+            key = (trade["exchange"], trade["instrument_token"])
+            position = positions.setdefault(
+                key,
+                {
+                    "exchange": key[0],
+                    "instrument_token": key[1],
+                    "net_quantity": 0,
+                },
+            )
+            quantity = trade["filled_quantity"] or 0
+            sign = 1 if trade["order_side"] == "BUY" else -1
+            position["net_quantity"] += sign * quantity
+        return 200, success(list(positions.values()))
+
+    def _orderHistory(self, params, body):
+        with self._lock:
+            history = self.history.get(str(params["oms_order_id"]))
+        if history is None:
+            return 400, failure("order not found")
+        return 200, success(history)
+
+    # market data
+
+    def _optionchain(self, params, body):
+        price = float(params.get("price", 20000))
+        count = int(params.get("num", 5))
+        token = int(params.get("token", 26000))
+        step = 50
+        atm = round(price / step) * step
+        strikes = []
+        for i, strike in enumerate(
+            range(atm - count * step, atm + (count + 1) * step, step)
+        ):
+            sides = {}
+            for side, option_type in (("call_option", "CE"), ("put_option", "PE")):
+                intrinsic = (
+                    max(price - strike, 0)
+                    if option_type == "CE"
+                    else max(strike - price, 0)
+                )
+                sides[side] = {
+                    "token": token * 1000 + 2 * i + (option_type == "PE"),
+                    "exchange": params.get("exchange", "NFO"),
+                    "symbol": f"MOCK{strike}{option_type}",
+                    "trading_symbol": f"MOCK{strike}{option_type}",
+                    "close_price": f"{intrinsic + 50:.2f}",
+                }
+            strikes.append({"strike_price": strike, **sides})
+        expiry = time.strftime("%d%b%y", time.localtime()).upper()
+        return 200, {"result": [{"expiry_date": expiry, "strikes": strikes}]}
+
+    def _charts(self, params, body):
+        start = int(params.get("starttime", time.time() - 86400))
+        end = int(params.get("endtime", time.time()))
+        step = int(params.get("data_duration", 5)) * 60
+        price = 20000.0
+        candles = []
+        for timestamp in range(start - start % step, end, step):
+            high = price + self.rng.random() * 20
+            low = price - self.rng.random() * 20
+            close = self.rng.uniform(low, high)
+            candles.append(
+                [
+                    timestamp,
+                    round(price, 2),
+                    round(high, 2),
+                    round(low, 2),
+                    round(close, 2),
+                    self.rng.randint(1000, 9000),
+                ]
+            )
+            price = close
+        return 200, {"status": "success", "data": {"candles": candles}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock = None
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+        status, payload = self.mock.handle(
+            self.command, parts.path, parse_qs(parts.query), body
+        )
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+    broker = MockBroker(
+        args.host,
+        args.port,
+        args.latency,
+        args.jitter,
+        args.error_rate,
+        args.error_status,
+    )
+    print(f"mock broker on {broker.start()}")
+    try:
+        while True:
+            time.sleep(10)
+            print(broker.stats())
+    except KeyboardInterrupt:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Local stand-in for the Stocko websocket feed.
+
+Speaks the binary frames AlphaTrade decodes, MARKETDATA, COMPACT,
+SNAPQUOTE and FULL_SNAPQUOTE ticks, MARKET_STATUS, EXCHANGE_MESSAGES
+and ORDERUPDATE, and honours the subscribe, unsubscribe and
+heartbeat json of the client. Prices of every instrument follow a
+random walk and each subscribed instrument ticks tick_rate times a
+second, so thousands of instruments can be streamed offline to
+measure the client stack.
+
+    python -m stocko.mockfeed --instruments 5000 --tick-rate 4
+
+and start_websocket(url="ws://127.0.0.1:8765") or async_feed(url=...).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import struct
+import threading
+import time
+
+import websockets
+
+from stocko.protlib import BYTE_ORDER, CArray
+from stocko.stockoapi import (
+    FEED_MODES,
+    TICK_FRAMES,
+    ExchangeMessage,
+    LiveFeedType,
+    MarketStatus,
+    WsFrameMode,
+)
+
+logger = logging.getLogger(__name__)
+
+# "m" of a subscription to the frame mode it is answered with
+FRAME_MODES = {FEED_MODES[feed]: WsFrameMode(feed.value) for feed in LiveFeedType}
+ORDER_UPDATES = "updates"
+# exchange code to the price multiplier of the frames
+MULTIPLIERS = {1: 100, 2: 100, 3: 10000000, 4: 100, 6: 100, 7: 100}
+
+
+def frame_encoder(mode):
+    """bytes of a tick frame of mode from a dict holding at least its fields"""
+    cstruct = TICK_FRAMES[mode]
+    packer = struct.Struct(BYTE_ORDER + cstruct.struct_format())
+    fields = [(name, isinstance(ctype, CArray)) for name, ctype in cstruct.get_fields()]
+    head = bytes([mode])
+
+    def encode(values):
+        flat = []
+        for name, is_array in fields:
+            if is_array:
+                flat.extend(values[name])
+            else:
+                flat.append(values[name])
+        return head + packer.pack(*flat)
+
+    return encode
+
+
+class MockInstrument:
+    """random walk of one instrument, prices in paise like the frames"""
+
+    def __init__(self, exchange, token, price, rng):
+        self.exchange = exchange
+        self.token = token
+        self.close = price
+        self.open = self.high = self.low = self.ltp = price
+        self.volume = 0
+        self.rng = rng
+        self.step = max(MULTIPLIERS.get(exchange, 100) // 20, 1)
+
+    def tick(self, now):
+        ltp = max(self.ltp + self.rng.randint(-3, 3) * self.step, self.step)
+        ltq = self.rng.randint(1, 50)
+        self.ltp, self.volume = ltp, self.volume + ltq
+        self.high, self.low = max(self.high, ltp), min(self.low, ltp)
+        step = self.step
+        bids = [ltp - step * i for i in range(1, 6)]
+        asks = [ltp + step * i for i in range(1, 6)]
+        quantities = [self.rng.randint(1, 500) for _ in range(5)]
+        return {
+            "exchange": self.exchange,
+            "token": self.token,
+            "ltp": ltp,
+            "ltt": now,
+            "ltq": ltq,
+            "volume": self.volume,
+            "change": abs(ltp - self.close),
+            "best_bid_price": bids[0],
+            "best_bid_quantity": quantities[0],
+            "best_ask_price": asks[0],
+            "best_ask_quantity": quantities[1],
+            "total_buy_quantity": sum(quantities) * 10,
+            "total_sell_quantity": sum(quantities) * 9,
+            "atp": (self.high + self.low) // 2,
+            "exchange_time_stamp": now,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "yearly_high": self.high * 2,
+            "yearly_low": self.low // 2,
+            "low_dpr": self.close * 8 // 10,
+            "high_dpr": self.close * 12 // 10,
+            "current_oi": 1000,
+            "initial_oi": 900,
+            "buyers": [1, 2, 3, 4, 5],
+            "bid_prices": bids,
+            "bid_quantities": quantities,
+            "sellers": [5, 4, 3, 2, 1],
+            "ask_prices": asks,
+            "ask_quantities": quantities[::-1],
+        }
+
+
+class MockFeedServer:
+    """
+    Websocket server streaming random ticks to every client
+
+    Parameters
+    ----------
+    host, port : str, int
+        where to listen, port 0 picks a free one
+    instruments : int or iterable
+        (exchange code, token) pairs that exist, or that many NFO
+        tokens from 1, subscriptions to others are ignored
+    tick_rate : float
+        ticks per second of every subscribed instrument
+    status_interval : float
+        seconds between MARKET_STATUS and EXCHANGE_MESSAGES frames,
+        None sends none
+    stamp_field : str
+        unsigned tick field overwritten with the send time in
+        microseconds modulo 2**32, for latency measurements on one host
+    seed : int
+        of the random walks
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=8765,
+        instruments=1000,
+        tick_rate: float = 1,
+        status_interval=None,
+        stamp_field=None,
+        seed=None,
+    ):
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.status_interval = status_interval
+        self.stamp_field = stamp_field
+        rng = random.Random(seed)
+        if isinstance(instruments, int):
+            instruments = [(2, token) for token in range(1, instruments + 1)]
+        self.instruments = {
+            (exchange, token): MockInstrument(
+                exchange, token, rng.randint(100, 50000) * 100, rng
+            )
+            for exchange, token in instruments
+        }
+        self.encoders = {mode: frame_encoder(mode) for mode in TICK_FRAMES}
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.heartbeats = 0
+        self.clients = set()
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    # lifecycle
+
+    async def start(self):
+        self._server = await websockets.serve(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop = asyncio.get_running_loop()
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def start_in_thread(self):
+        """serves on a background event loop, returns the url once listening"""
+        started = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="mockfeed", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.url
+
+    def stop_thread(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return dict(
+            clients=len(self.clients),
+            frames_sent=self.frames_sent,
+            bytes_sent=self.bytes_sent,
+            heartbeats=self.heartbeats,
+        )
+
+    # order updates
+
+    def order_update(self, update):
+        """pushes an ORDERUPDATE frame to clients subscribed to updates"""
+        payload = json.dumps(update).encode()
+        frame = bytes([WsFrameMode.ORDERUPDATE]) + struct.pack("!I", len(payload))
+        frame += payload
+        for client in list(self.clients):
+            if client.updates:
+                self._loop.call_soon_threadsafe(
+                    asyncio.ensure_future, self._send(client.ws, frame)
+                )
+
+    # one connection
+
+    async def _serve(self, ws):
+        client = _Client(ws)
+        self.clients.add(client)
+        tasks = [asyncio.create_task(self._stream(client))]
+        if self.status_interval:
+            tasks.append(asyncio.create_task(self._status(client)))
+        try:
+            async for message in ws:
+                self._on_message(client, message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.clients.discard(client)
+
+    def _on_message(self, client, message):
+        try:
+            request = json.loads(message)
+            action, values, feed = request["a"], request["v"], request["m"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"mock feed ignored {message!r}")
+            return
+        if action == "h":
+            # sent as ping frames by AlphaTrade and AsyncFeed, which
+            # websockets answers itself, only text ones get here
+            self.heartbeats += 1
+        elif feed == ORDER_UPDATES:
+            client.updates = action == "subscribe"
+        elif feed in FRAME_MODES:
+            mode = FRAME_MODES[feed]
+            for exchange, token in values:
+                key = (int(exchange), int(token))
+                if key not in self.instruments:
+                    continue
+                if action == "subscribe":
+                    client.subscribed[(key, mode)] = 0.0
+                elif action == "unsubscribe":
+                    client.subscribed.pop((key, mode), None)
+
+    async def _send(self, ws, frame):
+        try:
+            await ws.send(frame)
+        except websockets.ConnectionClosed:
+            return
+        self.frames_sent += 1
+        self.bytes_sent += len(frame)
+
+    async def _stream(self, client, period=0.01):
+        """ticks every subscription tick_rate times a second, in bursts of period"""
+        ws = client.ws
+        while True:
+            await asyncio.sleep(period)
+            if not client.subscribed:
+                continue
+            now = int(time.time())
+            credit = self.tick_rate * period
+            frames = []
+            for key_mode, owed in list(client.subscribed.items()):
+                owed += credit
+                count = int(owed)
+                client.subscribed[key_mode] = owed - count
+                if not count:
+                    continue
+                key, mode = key_mode
+                encode = self.encoders[mode]
+                instrument = self.instruments[key]
+                for _ in range(count):
+                    frames.append((instrument.tick(now), encode))
+            for values, encode in frames:
+                if self.stamp_field:
+                    values[self.stamp_field] = (time.time_ns() // 1000) & 0xFFFFFFFF
+                await self._send(ws, encode(values))
+
+    async def _status(self, client):
+        exchanges = sorted({exchange for exchange, _ in self.instruments})
+        while True:
+            await asyncio.sleep(self.status_interval)
+            for exchange in exchanges:
+                status = MarketStatus(
+                    exchange=exchange,
+                    length_of_market_type=6,
+                    market_type=b"NORMAL",
+                    length_of_status=4,
+                    status=b"OPEN",
+                )
+                await self._send(
+                    client.ws, bytes([WsFrameMode.MARKET_STATUS]) + status.serialize()
+                )
+                text = b"mock feed heartbeat"
+                message = ExchangeMessage(
+                    exchange=exchange,
+                    length=len(text),
+                    message=text,
+                    exchange_time_stamp=int(time.time()),
+                )
+                await self._send(
+                    client.ws,
+                    bytes([WsFrameMode.EXCHANGE_MESSAGES]) + message.serialize(),
+                )
+
+
+class _Client:
+    def __init__(self, ws):
+        self.ws = ws
+        # {((exchange, token), mode): ticks owed, fractional}
+        self.subscribed = {}
+        self.updates = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--instruments", type=int, default=1000)
+    parser.add_argument("--tick-rate", type=float, default=1)
+    parser.add_argument("--status-interval", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    async def serve():
+        server = MockFeedServer(
+            args.host,
+            args.port,
+            args.instruments,
+            args.tick_rate,
+            args.status_interval,
+            seed=args.seed,
+        )
+        async with server:
+            print(f"mock feed on {server.url}")
+            while True:
+                await asyncio.sleep(10)
+                print(server.stats())
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
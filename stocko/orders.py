@@ -0,0 +1,219 @@
+"""
+Non-blocking order gateway.
+
+Orders are handed to a small thread pool and the caller gets an
+OrderHandle back at once. The handle is acknowledged by whichever
+arrives first, the REST response carrying the oms_order_id or an
+ORDERUPDATE frame for that id, and the submit to ack time of every
+order is kept in LatencyStats.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from stocko.session import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+EARLY_UPDATES = 1024
+
+# outcome of one leg of a batch, response or error is None
+LegResult = namedtuple("LegResult", ["request", "response", "error", "oms_order_id"])
+
+
+def order_id_of(response):
+    """oms_order_id of a place order response or order update, else None"""
+    if isinstance(response, (str, int)):
+        return str(response)
+    if isinstance(response, dict):
+        if response.get("oms_order_id") is not None:
+            return str(response["oms_order_id"])
+        if isinstance(response.get("data"), dict):
+            return order_id_of(response["data"])
+    return None
+
+
+def never_sent(error):
+    """
+    True when a requests error happened while connecting, so the broker
+    cannot have seen the request and it is safe to send it again. A
+    reset or disconnect on a connection that was already open may come
+    after the body went out and is False.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError):
+        return False
+    # requests wraps urllib3's MaxRetryError, whose reason is the cause,
+    # NameResolutionError is a NewConnectionError too
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, NewConnectionError)
+
+
+def run_parallel(calls, workers=8):
+    """
+    runs (request, function) pairs on a thread pool,
+    returns one LegResult per pair in the same order
+    """
+
+    def run(request, function):
+        try:
+            response = function()
+        except Exception as e:
+            return LegResult(request, None, e, None)
+        return LegResult(request, response, None, order_id_of(response))
+
+    if not calls:
+        return []
+    with ThreadPoolExecutor(min(workers, len(calls))) as pool:
+        return list(pool.map(lambda call: run(*call), calls))
+
+
+class OrderHandle:
+    """
+    One submitted order
+
+    Attributes
+    ----------
+    tag : int
+        gateway sequence number of the order
+    future : Future
+        resolves to the REST response or raises its error
+    oms_order_id : str
+        broker order id once acknowledged
+    ack_source : str
+        "rest" or "ws", whichever acknowledged the order first
+    updates : list
+        ORDERUPDATE messages received for the order
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.future = None
+        self.oms_order_id = None
+        self.ack_source = None
+        self.updates = []
+        self.submitted_at = time.perf_counter()
+        self.acked_at = None
+        self._acked = threading.Event()
+
+    def __repr__(self):
+        return (
+            f"OrderHandle(tag={self.tag}, oms_order_id={self.oms_order_id}, "
+            f"ack_source={self.ack_source}, latency={self.latency})"
+        )
+
+    @property
+    def acked(self):
+        return self._acked.is_set()
+
+    @property
+    def latency(self):
+        """submit to ack in seconds, None until acknowledged"""
+        return None if self.acked_at is None else self.acked_at - self.submitted_at
+
+    @property
+    def status(self):
+        if self.updates:
+            return self.updates[-1].get("order_status")
+        if self.future is not None and self.future.done() and self.future.exception():
+            return "error"
+        return "acked" if self.acked else "pending"
+
+    def wait(self, timeout=None):
+        """blocks until the order is acknowledged, False on timeout"""
+        return self._acked.wait(timeout)
+
+
+class OrderGateway:
+    """
+    Places orders on worker threads and tracks their acknowledgements
+
+    Parameters
+    ----------
+    workers : int
+        orders in flight at the same time, each one holds a
+        pooled connection of the broker session while it waits
+    """
+
+    def __init__(self, workers: int = 4):
+        self.metrics = LatencyStats()
+        self.__pool = ThreadPoolExecutor(workers, thread_name_prefix="order")
+        self.__tags = itertools.count(1)
+        self.__lock = threading.Lock()
+        self.__by_id = {}
+        # updates that beat the REST response of their order, bounded
+        # since orders placed elsewhere never claim theirs
+        self.__early = OrderedDict()
+
+    def submit(self, method, *args, **kwargs) -> OrderHandle:
+        """
+        calls method(*args, **kwargs) on the pool, e.g. broker.buy_bo,
+        and returns the handle of the order without waiting
+        """
+        handle = OrderHandle(next(self.__tags))
+        handle.future = self.__pool.submit(self.__send, handle, method, args, kwargs)
+        return handle
+
+    def __send(self, handle, method, args, kwargs):
+        try:
+            response = method(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"order {handle.tag} failed: {e}")
+            raise
+        self.metrics.record("submit_to_rest", time.perf_counter() - handle.submitted_at)
+        oms_order_id = order_id_of(response)
+        if oms_order_id is None:
+            logger.warning(f"order {handle.tag} was not accepted: {response}")
+            return response
+        with self.__lock:
+            handle.oms_order_id = oms_order_id
+            self.__by_id[oms_order_id] = handle
+            early = self.__early.pop(oms_order_id, [])
+        for message, arrived_at in early:
+            self.__apply(handle, message, arrived_at)
+        self.__ack(handle, "rest")
+        return response
+
+    def on_order_update(self, message):
+        """ORDERUPDATE callback of the websocket"""
+        oms_order_id = order_id_of(message)
+        if oms_order_id is None:
+            return
+        with self.__lock:
+            handle = self.__by_id.get(oms_order_id)
+            if handle is None:
+                early = self.__early.setdefault(oms_order_id, [])
+                early.append((message, time.perf_counter()))
+                if len(self.__early) > EARLY_UPDATES:
+                    self.__early.popitem(last=False)
+                return
+        self.__apply(handle, message)
+
+    def __apply(self, handle, message, arrived_at=None):
+        handle.updates.append(message)
+        self.__ack(handle, "ws", arrived_at)
+
+    def __ack(self, handle, source, at=None):
+        with self.__lock:
+            if handle.acked_at is not None:
+                return
+            handle.acked_at = time.perf_counter() if at is None else at
+            handle.ack_source = source
+        self.metrics.record("submit_to_ack", handle.latency)
+        self.metrics.record(f"submit_to_ack_{source}", handle.latency)
+        handle._acked.set()
+
+    def get(self, oms_order_id):
+        return self.__by_id.get(str(oms_order_id))
+
+    def shutdown(self, wait=True):
+        self.__pool.shutdown(wait=wait)
@@ -0,0 +1,186 @@
+"""
+Raw websocket frame recorder and replay.
+
+TickRecorder appends every frame AlphaTrade receives, with its
+receive time, to one directory per day split into segments of a
+bounded size. Each segment starts with MAGIC followed by records of
+
+    RECORD header: receive time in ns, frame length, frame kind
+    the frame itself
+
+TickReader memory-maps the segments and replays them into any
+callback, at the recorded pace, faster or as fast as possible, so
+decoders, candles and renko can be benchmarked offline against the
+same frames every time.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"STKREC1\n"
+RECORD = struct.Struct("<qIB")
+BINARY, TEXT = 2, 1
+SEGMENT_SUFFIX = ".ticks"
+
+
+def segments(directory, day=None):
+    """segment files under directory, of one day if given, oldest first"""
+    root = Path(directory)
+    days = [root / day.isoformat()] if day else sorted(root.iterdir())
+    return [
+        path
+        for folder in days
+        if folder.is_dir()
+        for path in sorted(folder.glob("*" + SEGMENT_SUFFIX))
+    ]
+
+
+class TickRecorder:
+    """
+    Appends raw frames to day directories of rotated segments
+
+    Parameters
+    ----------
+    directory : str
+        root of the day directories, created when missing
+    segment_size : int
+        bytes after which the next segment is started
+    buffering : int
+        write buffer, frames reach the disk when it fills,
+        on rotation and on flush() or close()
+    """
+
+    def __init__(self, directory, segment_size: int = 256 << 20, buffering=1 << 20):
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.buffering = buffering
+        self.frames = 0
+        self.path = None
+        self.__file = None
+        self.__written = 0
+        self.__day_ends = 0
+        self.__lock = threading.Lock()
+
+    def record(self, frame, received_at=None):
+        """appends one frame, received_at in ns since the epoch"""
+        if received_at is None:
+            received_at = time.time_ns()
+        if isinstance(frame, str):
+            frame, kind = frame.encode(), TEXT
+        else:
+            kind = BINARY
+        with self.__lock:
+            if (
+                received_at >= self.__day_ends
+                or self.__written + len(frame) > self.segment_size
+            ):
+                self.__rotate(received_at)
+            self.__file.write(RECORD.pack(received_at, len(frame), kind))
+            self.__file.write(frame)
+            self.__written += RECORD.size + len(frame)
+            self.frames += 1
+
+    def __rotate(self, received_at):
+        if self.__file is not None:
+            self.__file.close()
+        moment = datetime.fromtimestamp(received_at / 1e9)
+        midnight = datetime.combine(
+            moment.date() + timedelta(days=1), datetime.min.time()
+        )
+        self.__day_ends = int(midnight.timestamp() * 1e9)
+        folder = self.directory / moment.date().isoformat()
+        folder.mkdir(parents=True, exist_ok=True)
+        index = len(list(folder.glob("*" + SEGMENT_SUFFIX)))
+        self.path = folder / f"{index:04d}{SEGMENT_SUFFIX}"
+        self.__file = open(self.path, "wb", buffering=self.buffering)
+        self.__file.write(MAGIC)
+        self.__written = len(MAGIC)
+
+    def flush(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.flush()
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+                self.__day_ends = 0
+
+
+class TickReader:
+    """
+    Reads recorded frames back through mmap
+
+    Parameters
+    ----------
+    source : str, Path or list
+        a segment, a day directory, the recorder root (every day)
+        or a list of segments
+    day : date
+        only this day when source is the recorder root
+    """
+
+    def __init__(self, source, day: date = None):
+        if isinstance(source, (list, tuple)):
+            self.paths = [Path(p) for p in source]
+        elif Path(source).is_file():
+            self.paths = [Path(source)]
+        elif any(Path(source).glob("*" + SEGMENT_SUFFIX)):
+            self.paths = sorted(Path(source).glob("*" + SEGMENT_SUFFIX))
+        else:
+            self.paths = segments(source, day)
+
+    def __iter__(self):
+        """(receive time in ns, frame) in recorded order"""
+        for path in self.paths:
+            if os.path.getsize(path) <= len(MAGIC):
+                continue
+            with open(path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mm:
+                if mm[: len(MAGIC)] != MAGIC:
+                    logger.warning(f"{path} is not a tick recording, skipped")
+                    continue
+                pos, end = len(MAGIC), len(mm)
+                while pos + RECORD.size <= end:
+                    received_at, length, kind = RECORD.unpack_from(mm, pos)
+                    pos += RECORD.size
+                    if pos + length > end:
+                        # cut short by a crash, the rest is lost
+                        logger.warning(f"{path} ends in a partial frame")
+                        break
+                    frame = mm[pos : pos + length]
+                    pos += length
+                    yield received_at, frame.decode() if kind == TEXT else frame
+
+    def replay(self, callback, speed=None, stopped=None):
+        """
+        calls callback(frame) for every frame, spaced like they were
+        received divided by speed, or back to back when speed is None.
+        stops early once the stopped Event is set, returns the count
+        """
+        count = 0
+        first = started = None
+        for received_at, frame in self:
+            if stopped is not None and stopped.is_set():
+                break
+            if speed:
+                if first is None:
+                    first, started = received_at, time.perf_counter()
+                delay = (received_at - first) / 1e9 / speed
+                ahead = started + delay - time.perf_counter()
+                if ahead > 0:
+                    time.sleep(ahead)
+            callback(frame)
+            count += 1
+        return count
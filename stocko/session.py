@@ -0,0 +1,121 @@
+"""
+Shared http session for the Connect and AlphaTrade REST calls.
+
+One pooled keep-alive requests.Session per client, so orders and
+order book polls reuse an open TLS connection instead of paying a
+fresh handshake every call, and the wall time of every call is kept
+per endpoint.
+"""
+
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class LatencyStats:
+    """
+    Wall time of the last `window` calls of every endpoint
+
+    Parameters
+    ----------
+    window : int
+        samples kept per endpoint for the percentiles
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.__samples = {}
+        self.__counts = {}
+        self.__lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self.__lock:
+            samples = self.__samples.get(name)
+            if samples is None:
+                samples = self.__samples[name] = deque(maxlen=self.window)
+                self.__counts[name] = 0
+            samples.append(seconds)
+            self.__counts[name] += 1
+
+    def summary(self):
+        """{endpoint: {count, last_ms, mean_ms, p50_ms, p99_ms, max_ms}}"""
+        with self.__lock:
+            items = [(k, list(v), self.__counts[k]) for k, v in self.__samples.items()]
+        summary = {}
+        for name, samples, count in items:
+            ms = np.asarray(samples) * 1e3
+            summary[name] = dict(
+                count=count,
+                last_ms=float(ms[-1]),
+                mean_ms=float(ms.mean()),
+                p50_ms=float(np.percentile(ms, 50)),
+                p99_ms=float(np.percentile(ms, 99)),
+                max_ms=float(ms.max()),
+            )
+        return summary
+
+    def reset(self):
+        with self.__lock:
+            self.__samples.clear()
+            self.__counts.clear()
+
+
+class HttpSession:
+    """
+    requests.Session with a connection pool, keep-alive,
+    a default timeout and latency metrics per endpoint
+
+    Parameters
+    ----------
+    pool_size : int
+        connections kept open per host
+    timeout : float or tuple
+        default (connect, read) timeout in seconds of every call
+    retries : int
+        retries on connection errors, never on a sent request
+    """
+
+    def __init__(self, pool_size: int = 10, timeout=(3.05, 10), retries: int = 0):
+        self.timeout = timeout
+        self.metrics = LatencyStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Connection"] = "keep-alive"
+
+    def request(self, method, url, metric=None, **kwargs):
+        """
+        same as requests.request, the call is recorded under metric
+        or under "<METHOD> <path>" when no name is given
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if metric is None:
+            metric = f"{method.upper()} {urlsplit(url).path}"
+        start = time.perf_counter()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            self.metrics.record(metric, time.perf_counter() - start)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.session.close()
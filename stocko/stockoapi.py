@@ -6,7 +6,6 @@ Modified By Sanju for Stocko on 01-01-2025.
 
 from constants import S_DATA
 
-import csv
 import os
 import json
 import requests
@@ -14,9 +13,9 @@ import threading
 import websocket
 import logging
 import enum
+import functools
 from datetime import datetime
 from time import sleep
-from collections import OrderedDict
 from stocko.protlib import (
     CUInt,
     CStruct,
@@ -26,18 +25,26 @@ from stocko.protlib import (
     CUShort,
     CString,
 )
-from collections import namedtuple
 import pandas as pd
 import pytz
 import stocko.exceptions as ex
 from stocko.connect import Connect
+from stocko.decoders import compile_converter, compile_cstruct
+from stocko.orders import LegResult, never_sent, order_id_of, run_parallel
+from stocko.wsstate import ConnectionState
+from stocko.dispatch import LatestTicks, TickDispatcher
+from stocko.subscriptions import SubscriptionManager
+from stocko.masters import (
+    MASTER_CSV,
+    Instrument,
+    SymbolIndex,
+    build_index,
+    load_master,
+)
 import zipfile
 from pathlib import Path
 import shutil
 
-Instrument = namedtuple(
-    "Instrument", ["exchange", "token", "symbol", "name", "expiry", "lot_size"]
-)
 logger = logging.getLogger(__name__)
 
 
@@ -75,6 +82,15 @@ class LiveFeedType(enum.Enum):
     # OI = 8
 
 
+# websocket "m" of each feed type
+FEED_MODES = {
+    LiveFeedType.MARKET_DATA: "marketdata",
+    LiveFeedType.COMPACT: "compact_marketdata",
+    LiveFeedType.SNAPQUOTE: "snapquote",
+    LiveFeedType.FULL_SNAPQUOTE: "full_snapquote",
+}
+
+
 class WsFrameMode(enum.IntEnum):
     MARKETDATA = 1
     COMPACT_MARKETDATA = 2
@@ -185,6 +201,38 @@ class MarketStatus(CStruct):
     status = CString(length="length_of_status")
 
 
+# tick frames are fixed-size, so each struct gets a generated decoder;
+# the protlib classes above remain the reference used by validate_frames
+TICK_FRAMES = {
+    WsFrameMode.MARKETDATA: MarketData,
+    WsFrameMode.COMPACT_MARKETDATA: CompactData,
+    WsFrameMode.SNAPQUOTE: SnapQuote,
+    WsFrameMode.FULL_SNAPQUOTE: FullSnapQuote,
+}
+TICK_DECODERS = {
+    mode: compile_cstruct(cstruct) for mode, cstruct in TICK_FRAMES.items()
+}
+# tick fields in paise (or 1e-7 rupee for CDS) that get scaled to rupees
+PRICE_FIELDS = frozenset(
+    [
+        "ltp",
+        "best_bid_price",
+        "best_ask_price",
+        "atp",
+        "open",
+        "high",
+        "low",
+        "close",
+        "yearly_high",
+        "yearly_low",
+        "low_dpr",
+        "high_dpr",
+        "bid_prices",
+        "ask_prices",
+    ]
+)
+
+
 class AlphaTrade(Connect):
     # dictionary object to hold settings
     __service_config = {
@@ -202,8 +250,12 @@ class AlphaTrade(Connect):
             "place_basket_order": "/api/v2/basketorder",
             "modify_order": "/api/v1/orders",
             "cancelNormalOrder": "/api/v1/orders/{oms_order_id}?client_id={client_id}",
-            "exitBracketOrder": "/v1/orders/bracket",
-            "exitCoverOrder": "/v1/orders/cover",
+            "exitBracketOrder": "/v1/orders/bracket?oms_order_id={oms_order_id}"
+            "&leg_order_indicator={leg_order_indicator}&client_id={client_id}"
+            "&execution_type={execution_type}",
+            "exitCoverOrder": "/v1/orders/cover?oms_order_id={oms_order_id}"
+            "&leg_order_indicator={leg_order_indicator}&client_id={client_id}"
+            "&execution_type={execution_type}",
             "positionBook": "/api/v1/positions?type={type}&client_id={client_id}",
             "trade_book": "/api/v1/trades?client_id={client_id}",
             "order_book": "/api/v1/orders?type={type}&client_id={client_id}",
@@ -261,15 +313,24 @@ class AlphaTrade(Connect):
         client_secret,
         access_token=None,
         master_contracts_to_download=None,
+        pool_size=10,
+        timeout=(3.05, 10),
+        base_url=None,
     ):
+        # base_url sends every api, chart and master contract request
+        # to another host, such as a stocko.mockbroker.MockBroker
+        self.__host = base_url or self.__service_config["host"]
+        self.__web_host = base_url or "https://web.stocko.in"
         super().__init__(
             "SAS-CLIENT1",
             client_secret,
             "http://127.0.0.1/",
-            "https://api.stocko.in",
+            base_url or "https://api.stocko.in",
             login_id,
             password,
             totp,
+            pool_size=pool_size,
+            timeout=timeout,
         )
         """ logs in and gets enabled exchanges and products for user """
         self.__access_token = access_token
@@ -281,7 +342,8 @@ class AlphaTrade(Connect):
         # self.__twofa = twofa
         self.__client_secret = client_secret
         self.__websocket = None
-        self.__websocket_connected = False
+        self.__connection = ConnectionState()
+        self.__ws_send_timeout = None
         self.__ws_mutex = threading.Lock()
         self.__on_error = None
         self.__on_disconnect = None
@@ -292,7 +354,13 @@ class AlphaTrade(Connect):
         self.__exchange_messages_callback = None
         self.__oi_callback = None
         self.__dpr_callback = None
+        self.__validate_frames = False
+        self.__dispatcher = None
+        self.__latest = None
+        self.__recorder = None
+        self.__replaying = False
         self.__subscribers = {}
+        self.__subscriptions = SubscriptionManager(self.__ws_send)
         self.__market_status_messages = []
         self.__exchange_messages = []
         self.__exchange_codes = {
@@ -311,6 +379,30 @@ class AlphaTrade(Connect):
             6: 100,
             7: 100,
         }
+        # indexed by exchange code, for the tick converters
+        exchange_names = [None] * (max(self.__exchange_codes.values()) + 1)
+        multipliers = [None] * len(exchange_names)
+        for name, code in self.__exchange_codes.items():
+            exchange_names[code] = name
+            multipliers[code] = self.__exchange_price_multipliers[code]
+        self.__exchange_names = exchange_names
+        self.__instruments_by_code = {}
+        # {scale: {mode: converter}}, unscaled ones keep integer prices
+        self.__converters = {
+            scale: {
+                mode: compile_converter(
+                    cstruct,
+                    PRICE_FIELDS,
+                    exchange_names,
+                    multipliers,
+                    self.__instrument_by_code,
+                    scale=scale,
+                )
+                for mode, cstruct in TICK_FRAMES.items()
+            }
+            for scale in (True, False)
+        }
+        self.__tick_converters = self.__converters[True]
 
         self.__headers = {
             "Content-type": "application/json",
@@ -321,7 +413,8 @@ class AlphaTrade(Connect):
         self.check_masters()
         self.__master_contracts_by_token = {}
         self.__master_contracts_by_symbol = {}
-        [self.__get_master_contract(e) for e in master_contracts_to_download]
+        self.__symbol_indexes = {}
+        self.__get_master_contracts(master_contracts_to_download or [])
 
     def __set_access_token(self):
         try:
@@ -355,33 +448,6 @@ class AlphaTrade(Connect):
                     f"Couldn't get profile info '{profile['message']}'"
                 )
 
-    def __convert_prices(self, dictionary, multiplier):
-        keys = [
-            "ltp",
-            "best_bid_price",
-            "best_ask_price",
-            "atp",
-            "open",
-            "high",
-            "low",
-            "close",
-            "yearly_high",
-            "yearly_low",
-            "low_dpr",
-            "high_dpr",
-        ]
-        for key in keys:
-            if key in dictionary:
-                dictionary[key] = dictionary[key] / multiplier
-        multiple_value_keys = ["bid_prices", "ask_prices"]
-        for key in multiple_value_keys:
-            if key in dictionary:
-                new_values = []
-                for value in dictionary[key]:
-                    new_values.append(value / multiplier)
-                dictionary[key] = new_values
-        return dictionary
-
     def __format_candles(self, data, divider=1):
         records = data["data"]["candles"]
         df = pd.DataFrame(
@@ -408,29 +474,23 @@ class AlphaTrade(Connect):
             )
         return dictionary
 
-    def __convert_exchanges(self, dictionary):
-        if "exchange" in dictionary:
-            d = self.__exchange_codes
-            dictionary["exchange"] = list(d.keys())[
-                list(d.values()).index(dictionary["exchange"])
-            ]
-        return dictionary
-
-    def __convert_instrument(self, dictionary):
-        if ("exchange" in dictionary) and ("token" in dictionary):
-            dictionary["instrument"] = self.get_instrument_by_token(
-                dictionary["exchange"], dictionary["token"]
+    def __instrument_by_code(self, code, token):
+        key = (code, token)
+        try:
+            return self.__instruments_by_code[key]
+        except KeyError:
+            # misses are cached too, so they are logged once
+            instrument = self.get_instrument_by_token(
+                self.__exchange_names[code], token
             )
-        return dictionary
+            self.__instruments_by_code[key] = instrument
+            return instrument
 
-    def __modify_human_readable_values(self, dictionary):
-        dictionary = self.__convert_prices(
-            dictionary, self.__exchange_price_multipliers[dictionary["exchange"]]
-        )
-        dictionary = self.__convert_exchanges(dictionary)
-        dictionary = self.__convert_instrument(dictionary)
-        # dictionary = self.__convert_oi(dictionary)
-        return dictionary
+    def __modify_human_readable_values(self, mode, dictionary):
+        """scales prices, names the exchange and adds the instrument
+        of a tick decoded from a frame of mode, in place
+        """
+        return self.__tick_converters[mode](dictionary)
 
     def __on_data_callback(
         self, ws=None, message=None, data_type=None, continue_flag=None
@@ -439,24 +499,28 @@ class AlphaTrade(Connect):
             type(ws) is not websocket.WebSocketApp
         ):  # This workaround is to solve the websocket_client's compatibility issue of older versions. ie.0.40.0 which is used in upstox. Now this will work in both 0.40.0 & newer version of websocket_client
             message = ws
-        if message[0] == WsFrameMode.MARKETDATA:
-            p = MarketData.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            if self.__subscribe_callback is not None:
-                self.__subscribe_callback(res)
-        elif message[0] == WsFrameMode.COMPACT_MARKETDATA:
-            p = CompactData.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            if self.__subscribe_callback is not None:
-                self.__subscribe_callback(res)
-        elif message[0] == WsFrameMode.SNAPQUOTE:
-            p = SnapQuote.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            if self.__subscribe_callback is not None:
-                self.__subscribe_callback(res)
-        elif message[0] == WsFrameMode.FULL_SNAPQUOTE:
-            p = FullSnapQuote.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
+        if self.__recorder is not None:
+            self.__recorder.record(message)
+        if self.__latest is not None and message[0] in TICK_DECODERS:
+            # decoded when the consumer polls
+            self.__latest.put(message)
+        elif self.__dispatcher is not None:
+            # decoded and delivered on the dispatcher workers
+            self.__dispatcher.put(message)
+        else:
+            self.__handle_frame(message)
+
+    def __decode_tick(self, message):
+        if self.__validate_frames:
+            p = self.__parse_validated(message)
+        else:
+            p = TICK_DECODERS[message[0]](message, 1)
+        self.__subscriptions.on_tick(p["exchange"], p["token"])
+        return self.__modify_human_readable_values(message[0], p)
+
+    def __handle_frame(self, message):
+        if message[0] in TICK_DECODERS:
+            res = self.__decode_tick(message)
             if self.__subscribe_callback is not None:
                 self.__subscribe_callback(res)
         elif message[0] == WsFrameMode.MARKET_STATUS:
@@ -474,16 +538,27 @@ class AlphaTrade(Connect):
                 self.__exchange_messages_callback(res)
         elif message[0] == WsFrameMode.ORDERUPDATE:
             p = json.loads(message[5:])
-            if self.__subscribe_callback is not None:
+            if self.__order_update_callback is not None:
                 self.__order_update_callback(p)
 
+    def __parse_validated(self, message):
+        """decode with protlib and check the compiled decoder against it"""
+        expected = TICK_FRAMES[message[0]].parse(message[1:]).__dict__
+        compiled = TICK_DECODERS[message[0]](message, 1)
+        if compiled != expected:
+            logger.warning(
+                f"compiled decoder mismatch for frame mode {message[0]}: "
+                f"{compiled} != {expected}"
+            )
+        return expected
+
     def __on_close_callback(self, ws=None):
-        self.__websocket_connected = False
+        self.__connection.closed()
         if self.__on_disconnect:
             self.__on_disconnect()
 
     def __on_open_callback(self, ws=None):
-        self.__websocket_connected = True
+        self.__connection.opened()
         self.__resubscribe()
         if self.__on_open:
             self.__on_open()
@@ -500,25 +575,119 @@ class AlphaTrade(Connect):
         heart_beat = {"a": "h", "v": [], "m": ""}
         while True:
             sleep(5)
-            self.__ws_send(
-                json.dumps(heart_beat), opcode=websocket._abnf.ABNF.OPCODE_PING
-            )
+            if not self.__connection.is_open:
+                # nothing to keep alive until the socket is back
+                continue
+            try:
+                self.__ws_send(
+                    json.dumps(heart_beat), opcode=websocket._abnf.ABNF.OPCODE_PING
+                )
+            except Exception as e:
+                logger.warning(f"websocket heartbeat failed, {e}")
 
     def __ws_run_forever(self):
         while True:
+            self.__connection.connecting()
             try:
                 self.__websocket.run_forever()
             except Exception as e:
                 logger.warning(f"websocket run forever ended in exception, {e}")
+            self.__connection.closed()
             sleep(0.1)  # Sleep for 100ms between reconnection.
 
+    def __feed_url(self):
+        return self.__service_config["socket_endpoint"].format(
+            client_id=self.__login_id, access_token=self.__access_token
+        )
+
+    def __replay(self, reader, speed):
+        self.__connection.connecting()
+        self.__on_open_callback()
+        try:
+            reader.replay(self.__on_data_callback, speed)
+        finally:
+            self.__on_close_callback()
+
     def __ws_send(self, *args, **kwargs):
-        while self.__websocket_connected == False:
-            # sleep for 50ms if websocket is not connected, wait for reconnection
-            sleep(0.05)
+        if self.__replaying:
+            # subscriptions and heartbeats have no server to go to
+            return
+        # blocks until the websocket is (re)connected
+        if not self.__connection.wait(self.__ws_send_timeout):
+            raise ex.NetworkException(
+                f"websocket not connected within {self.__ws_send_timeout}s"
+            )
         with self.__ws_mutex:
             self.__websocket.send(*args, **kwargs)
 
+    def async_feed(
+        self,
+        on_tick=None,
+        on_order_update=None,
+        integer_prices=False,
+        url=None,
+        **kwargs,
+    ):
+        """asyncio feed of this account, ticks are converted like the
+        ones of start_websocket, see stocko.aiofeed.AsyncFeed for kwargs
+        """
+        from stocko.aiofeed import AsyncFeed
+
+        converters = self.__converters[not integer_prices]
+        url = url or self.__feed_url()
+        return AsyncFeed(
+            url,
+            on_tick=on_tick,
+            on_order_update=on_order_update,
+            transform=lambda mode, tick: converters[mode](tick),
+            **kwargs,
+        )
+
+    def instrument_pairs(self, instruments):
+        """(exchange code, token) of instruments, as the feed subscribes them"""
+        return [(self.__exchange_codes[i.exchange], int(i.token)) for i in instruments]
+
+    def price_multiplier(self, exchange):
+        """what prices of exchange are multiplied by in integer_prices ticks"""
+        return self.__exchange_price_multipliers[self.__exchange_codes[exchange]]
+
+    def poll_ticks(self):
+        """ticks that changed since the last poll, keyed by
+        (exchange code, token), when started with conflate_ticks
+        """
+        if self.__latest is None:
+            raise ex.GeneralException("websocket not started with conflate_ticks")
+        return self.__latest.poll()
+
+    def latest_tick(self, instrument):
+        """newest tick of instrument, when started with conflate_ticks"""
+        if self.__latest is None:
+            raise ex.GeneralException("websocket not started with conflate_ticks")
+        return self.__latest.get(
+            self.__exchange_codes[instrument.exchange], instrument.token
+        )
+
+    def conflation_stats(self):
+        """received, overwritten and decoded counts of conflate_ticks"""
+        if self.__latest is None:
+            return None
+        return self.__latest.stats()
+
+    def dispatch_stats(self):
+        """queue depth and drop/conflate counters of the tick dispatcher"""
+        if self.__dispatcher is None:
+            return None
+        return self.__dispatcher.stats()
+
+    @property
+    def websocket_state(self):
+        """ConnectionState of the feed, with connect and reconnect timings"""
+        return self.__connection
+
+    def wait_for_websocket(self, timeout=None):
+        """blocks until the websocket is open, False on timeout"""
+        return self.__connection.wait(timeout)
+
     def start_websocket(
         self,
         subscribe_callback=None,
@@ -531,8 +700,41 @@ class AlphaTrade(Connect):
         exchange_messages_callback=None,
         oi_callback=None,
         dpr_callback=None,
+        validate_frames=False,
+        send_timeout=None,
+        dispatch_workers=1,
+        queue_size=10_000,
+        queue_policy="block",
+        conflate_ticks=False,
+        integer_prices=False,
+        recorder=None,
+        replay=None,
+        replay_speed=None,
+        url=None,
     ):
-        """Start a websocket connection for getting live data"""
+        """Start a websocket connection for getting live data
+        validate_frames decodes ticks through protlib as well and logs any
+        difference from the compiled decoders
+        send_timeout bounds how long a send waits for the socket to
+        (re)connect before raising NetworkException, None waits forever
+        dispatch_workers threads decode and deliver the frames the socket
+        thread queues, 0 does it on the socket thread. queue_size bounds
+        each worker's queue and queue_policy is what happens when it is
+        full, see stocko.dispatch. The default "block" loses no tick,
+        "conflate" or the drop policies keep the socket thread moving
+        conflate_ticks keeps only the newest frame of every instrument
+        instead of calling subscribe_callback, read with poll_ticks()
+        or latest_tick() which decode on demand
+        integer_prices leaves tick prices as the integers of the frame,
+        in paise (1e-7 rupee for CDS), with the divisor as "multiplier"
+        recorder, a stocko.recorder.TickRecorder, gets every raw frame
+        replay, a stocko.recorder.TickReader, is played through the same
+        callbacks instead of connecting, at replay_speed times the
+        recorded pace or as fast as possible when it is None. Keep
+        queue_policy "block" to get every frame
+        url connects somewhere else than the Stocko feed, such as a
+        stocko.mockfeed.MockFeedServer
+        """
         self.__on_open = socket_open_callback
         self.__on_disconnect = socket_close_callback
         self.__on_error = socket_error_callback
@@ -542,12 +744,34 @@ class AlphaTrade(Connect):
         self.__exchange_messages_callback = exchange_messages_callback
         self.__oi_callback = oi_callback
         self.__dpr_callback = dpr_callback
+        self.__validate_frames = validate_frames
+        self.__ws_send_timeout = send_timeout
+        self.__tick_converters = self.__converters[not integer_prices]
+        if self.__dispatcher is not None:
+            self.__dispatcher.stop()
+            self.__dispatcher = None
+        self.__latest = LatestTicks(self.__decode_tick) if conflate_ticks else None
+        if dispatch_workers:
+            self.__dispatcher = TickDispatcher(
+                self.__handle_frame,
+                TICK_DECODERS,
+                workers=dispatch_workers,
+                maxsize=queue_size,
+                policy=queue_policy,
+            ).start()
+        self.__recorder = recorder
+        self.__replaying = replay is not None
+        if self.__replaying:
+            target = functools.partial(self.__replay, replay, replay_speed)
+            if run_in_background is True:
+                self.__ws_thread = threading.Thread(target=target, daemon=True)
+                self.__ws_thread.start()
+            else:
+                target()
+            return
 
-        url = self.__service_config["socket_endpoint"].format(
-            client_id=self.__login_id, access_token=self.__access_token
-        )
         self.__websocket = websocket.WebSocketApp(
-            url,
+            url or self.__feed_url(),
             on_data=self.__on_data_callback,
             on_error=self.__on_error_callback,
             on_close=self.__on_close_callback,
@@ -771,12 +995,19 @@ class AlphaTrade(Connect):
             order["is_trailing"] = is_trailing  # // Optional: true or false
         return self.__api_call_helper(helper, Requests.POST, None, order)
 
-    def place_basket_order(self, orders):  ############### work pending
+    def place_basket_order(self, orders, fallback=True, workers=8):
         """placing a basket order,
         Argument orders should be a list of all orders that should be sent
         each element in order should be a dictionary containing the following key.
         "instrument", "order_type", "quantity", "price" (only if its a limit order),
         "transaction_type", "product_type"
+        All legs go out in one request. If fallback is set and the
+        connection to the broker could not be made, or it rejected the
+        basket with status error, the legs are placed through place_order
+        in parallel instead. Any other failure, a timeout, a dropped
+        connection or a server error, raises OrderException, the basket
+        may have been accepted so it is never resent, see get_orderbook.
+        Returns one LegResult per element of orders, in the same order.
         """
         keys = {
             "instrument": Instrument,
@@ -791,6 +1022,7 @@ class AlphaTrade(Connect):
         if len(orders) <= 0:
             raise TypeError("Length of orders should be greater than 0")
 
+        legs = []
         for i in orders:
             if not isinstance(i, dict):
                 raise TypeError("Each element in orders should be of type dict")
@@ -801,6 +1033,8 @@ class AlphaTrade(Connect):
                     raise TypeError(
                         f"Element '{s}' in orders should be of type {keys[s]}"
                     )
+            # the caller's dicts are left as they are
+            i = dict(i)
             if i["order_type"] == OrderType.Limit:
                 if "price" not in i:
                     raise TypeError(
@@ -824,13 +1058,7 @@ class AlphaTrade(Connect):
                     )
             else:
                 i["trigger_price"] = 0.00
-            if i["product_type"] == ProductType.Intraday:
-                i["product_type"] = "MIS"
-            elif i["product_type"] == ProductType.Delivery:
-                i["product_type"] = (
-                    "NRML" if (i["instrument"].exchange == "NFO") else "CNC"
-                )
-            elif i["product_type"] in [
+            if i["product_type"] in [
                 ProductType.CoverOrder,
                 ProductType.BracketOrder,
             ]:
@@ -839,9 +1067,10 @@ class AlphaTrade(Connect):
                 )
             if i["quantity"] <= 0:
                 raise TypeError("Quantity should be greater than 0")
+            legs.append(i)
 
         data = {"source": "web", "orders": []}
-        for i in orders:
+        for i in legs:
             # construct order object after all required parameters are met
             data["orders"].append(
                 {
@@ -854,13 +1083,64 @@ class AlphaTrade(Connect):
                     "transaction_type": i["transaction_type"].value,
                     "trigger_price": i["trigger_price"],
                     "validity": "DAY",
-                    "product": i["product_type"],
+                    "product": self.__get_product_type_str(
+                        i["product_type"], i["instrument"].exchange
+                    ),
                 }
             )
 
-        helper = "place_basket_order"
-        print(data)
-        return self.__api_call_helper(helper, Requests.POST, None, data)
+        try:
+            response = self.__api_call_helper(
+                "place_basket_order", Requests.POST, None, data
+            )
+            if response.get("status") == "success":
+                return self.__basket_legs(orders, response)
+            if not fallback or response.get("status") != "error":
+                return [LegResult(i, response, None, None) for i in orders]
+            logger.warning(
+                f"basket order rejected, placing legs one by one: {response}"
+            )
+        except requests.RequestException as e:
+            if not never_sent(e):
+                # read timeouts, resets after the body went out and 5xx,
+                # the basket may be live already
+                raise ex.OrderException(
+                    f"basket order outcome unknown, check the order book: {e}"
+                ) from e
+            if not fallback:
+                raise
+            logger.warning(f"basket order not sent, placing legs one by one: {e}")
+
+        calls = [
+            (
+                order,
+                functools.partial(
+                    self.place_order,
+                    leg["instrument"],
+                    leg["order_type"],
+                    leg["quantity"],
+                    leg["product_type"],
+                    leg["transaction_type"],
+                    price=leg["price"],
+                    trigger_price=leg["trigger_price"],
+                ),
+            )
+            for order, leg in zip(orders, legs)
+        ]
+        return run_parallel(calls, workers)
+
+    def __basket_legs(self, orders, response):
+        """maps a basket response back onto the orders that were sent"""
+        results = response.get("data")
+        if isinstance(results, dict):
+            results = results.get("orders", results.get("result"))
+        if not isinstance(results, list) or len(results) != len(orders):
+            # no per leg breakdown, every leg gets the whole response
+            results = [response] * len(orders)
+        return [
+            LegResult(order, result, None, order_id_of(result))
+            for order, result in zip(orders, results)
+        ]
 
     def modify_order(
         self,
@@ -923,7 +1203,9 @@ class AlphaTrade(Connect):
         return self.__api_call_helper("modify_order", Requests.PUT, None, order)
 
     def cancel_order(self, order_id, leg_order_id=None, is_co=False):
-        """Cancel single order"""
+        """Cancel single order, BO and CO ones are exited by their
+        oms_order_id and leg_order_indicator
+        """
         if is_co == False:
             if leg_order_id is None:
                 ret = self.__api_call_helper(
@@ -954,7 +1236,7 @@ class AlphaTrade(Connect):
                 Requests.DELETE,
                 {
                     "oms_order_id": order_id,
-                    "leg_order_indicator": leg_order_id,
+                    "leg_order_indicator": leg_order_id or "",
                     "execution_type": "REGULAR",
                     "client_id": self.__login_id,
                 },
@@ -962,28 +1244,35 @@ class AlphaTrade(Connect):
             )
         return ret
 
-    def cancel_all_orders(self):  ################## PENDING work
-        """Cancel all orders"""
-        ret = []
-        orders = self.get_order_history()["data"]
+    def cancel_all_orders(self, workers=8):
+        """Cancel all pending orders, the order book is fetched once
+        and the cancels are sent in parallel, returns one LegResult
+        per pending order
+        """
+        orders = self.get_orderbook(pending=True).get("data")
+        if isinstance(orders, dict):
+            orders = orders.get("pending_orders") or orders.get("orders")
         if not orders:
-            return
-        for c_order in orders["pending_orders"]:
-            if c_order["product"] == "BO" and c_order["leg_order_indicator"]:
-                r = self.cancel_order(
-                    c_order["leg_order_indicator"],
+            return []
+        calls = []
+        for c_order in orders:
+            if c_order.get("product") == "BO" and c_order.get("leg_order_indicator"):
+                call = functools.partial(
+                    self.cancel_order,
+                    c_order["oms_order_id"],
                     leg_order_id=c_order["leg_order_indicator"],
                 )
-            elif c_order["product"] == "CO":
-                r = self.cancel_order(
+            elif c_order.get("product") == "CO":
+                call = functools.partial(
+                    self.cancel_order,
                     c_order["oms_order_id"],
-                    leg_order_id=c_order["leg_order_indicator"],
+                    leg_order_id=c_order.get("leg_order_indicator"),
                     is_co=True,
                 )
             else:
-                r = self.cancel_order(c_order["oms_order_id"])
-            ret.append(r)
-        return ret
+                call = functools.partial(self.cancel_order, c_order["oms_order_id"])
+            calls.append((c_order, call))
+        return run_parallel(calls, workers)
 
     def subscribe_market_status_messages(self):
         """Subscribe to market messages"""
@@ -1042,56 +1331,23 @@ class AlphaTrade(Connect):
         return self.__ws_send(data)
 
     def subscribe(self, instrument, live_feed_type):
-        """subscribe to the current feed of an instrument"""
+        """subscribe to the current feed of an instrument, requests made
+        within a few ms of each other go out together and instruments
+        already subscribed in that mode are skipped
+        """
         if type(live_feed_type) is not LiveFeedType:
             raise TypeError(
                 "Required parameter live_feed_type not of type LiveFeedType"
             )
+        instruments = instrument if isinstance(instrument, list) else [instrument]
         arr = []
-        if isinstance(instrument, list):
-            for _instrument in instrument:
-                if not isinstance(_instrument, Instrument):
-                    raise TypeError(
-                        "Required parameter instrument not of type Instrument"
-                    )
-                exchange = self.__exchange_codes[_instrument.exchange]
-                arr.append([exchange, int(_instrument.token)])
-                self.__subscribers[_instrument] = live_feed_type
-        else:
-            if not isinstance(instrument, Instrument):
+        for _instrument in instruments:
+            if not isinstance(_instrument, Instrument):
                 raise TypeError("Required parameter instrument not of type Instrument")
-            exchange = self.__exchange_codes[instrument.exchange]
-            arr = [[exchange, int(instrument.token)]]
-            self.__subscribers[instrument] = live_feed_type
-        if live_feed_type == LiveFeedType.MARKET_DATA:
-            mode = "marketdata"
-        elif live_feed_type == LiveFeedType.COMPACT:
-            mode = "compact_marketdata"
-        elif live_feed_type == LiveFeedType.SNAPQUOTE:
-            mode = "snapquote"
-        elif live_feed_type == LiveFeedType.FULL_SNAPQUOTE:
-            mode = "full_snapquote"
-        elif live_feed_type == LiveFeedType.OI:
-            mode = "open_interest"
-        elif message[0] == WsFrameMode.MARKET_STATUS:
-            p = MarketStatus.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            self.__market_status_messages.append(res)
-            if self.__market_status_messages_callback is not None:
-                self.__market_status_messages_callback(res)
-        elif message[0] == WsFrameMode.EXCHANGE_MESSAGES:
-            p = ExchangeMessage.parse(message[1:]).__dict__
-            res = self.__modify_human_readable_values(p)
-            self.__exchange_messages.append(res)
-            if self.__exchange_messages_callback is not None:
-                self.__exchange_messages_callback(res)
-        elif (
-            live_feed_type == LiveFeedType.ORDERUPDATE
-        ):  # message_type == "OrderUpdateMessage":
-            arr = "OrderUpdateMessage"
-            mode = "updates"
-        data = json.dumps({"a": "subscribe", "v": arr, "m": mode})
-        return self.__ws_send(data)
+            exchange = self.__exchange_codes[_instrument.exchange]
+            arr.append((exchange, int(_instrument.token)))
+            self.__subscribers[_instrument] = live_feed_type
+        self.__subscriptions.subscribe(arr, FEED_MODES[live_feed_type])
 
     def unsubscribe(self, instrument, live_feed_type):
         """unsubscribe to the current feed of an instrument"""
@@ -1099,64 +1355,28 @@ class AlphaTrade(Connect):
             raise TypeError(
                 "Required parameter live_feed_type not of type LiveFeedType"
             )
+        instruments = instrument if isinstance(instrument, list) else [instrument]
         arr = []
-        if isinstance(instrument, list):
-            for _instrument in instrument:
-                if not isinstance(_instrument, Instrument):
-                    raise TypeError(
-                        "Required parameter instrument not of type Instrument"
-                    )
-                exchange = self.__exchange_codes[_instrument.exchange]
-                arr.append([exchange, int(_instrument.token)])
-                if _instrument in self.__subscribers:
-                    del self.__subscribers[_instrument]
-        else:
-            if not isinstance(instrument, Instrument):
+        for _instrument in instruments:
+            if not isinstance(_instrument, Instrument):
                 raise TypeError("Required parameter instrument not of type Instrument")
-            exchange = self.__exchange_codes[instrument.exchange]
-            arr = [[exchange, int(instrument.token)]]
-            if instrument in self.__subscribers:
-                del self.__subscribers[instrument]
-        if live_feed_type == LiveFeedType.MARKET_DATA:
-            mode = "marketdata"
-        elif live_feed_type == LiveFeedType.COMPACT:
-            mode = "compact_marketdata"
-        elif live_feed_type == LiveFeedType.SNAPQUOTE:
-            mode = "snapquote"
-        elif live_feed_type == LiveFeedType.FULL_SNAPQUOTE:
-            mode = "full_snapquote"
-        elif live_feed_type == LiveFeedType.OI:
-            mode = "open_interest"
-
-        data = json.dumps({"a": "unsubscribe", "v": arr, "m": mode})
-        return self.__ws_send(data)
+            exchange = self.__exchange_codes[_instrument.exchange]
+            arr.append((exchange, int(_instrument.token)))
+            if _instrument in self.__subscribers:
+                del self.__subscribers[_instrument]
+        self.__subscriptions.unsubscribe(arr, FEED_MODES[live_feed_type])
+
+    @property
+    def subscriptions(self):
+        """SubscriptionManager of the feed, with first tick latencies"""
+        return self.__subscriptions
 
     def get_all_subscriptions(self):
         """get the all subscribed instruments"""
         return self.__subscribers
 
     def __resubscribe(self):
-        market = []
-        compact = []
-        snap = []
-        full = []
-        for key, value in self.get_all_subscriptions().items():
-            if value == LiveFeedType.MARKET_DATA:
-                market.append(key)
-            elif value == LiveFeedType.COMPACT:
-                compact.append(key)
-            elif value == LiveFeedType.SNAPQUOTE:
-                snap.append(key)
-            elif value == LiveFeedType.FULL_SNAPQUOTE:
-                full.append(key)
-        if market:
-            self.subscribe(market, LiveFeedType.MARKET_DATA)
-        if compact:
-            self.subscribe(compact, LiveFeedType.COMPACT)
-        if snap:
-            self.subscribe(snap, LiveFeedType.SNAPQUOTE)
-        if full:
-            self.subscribe(full, LiveFeedType.FULL_SNAPQUOTE)
+        self.__subscriptions.resync()
 
     def get_instrument_by_symbol(self, exchange, symbol):
         """get instrument by providing symbol"""
@@ -1183,61 +1403,45 @@ class AlphaTrade(Connect):
         strike=None,
         is_call=False,
         exchange="NFO",
-    ):  ###pending work
+    ):
         """get instrument for FNO"""
-        res = self.search_instruments(exchange, symbol)
-        if res == None:
+        index = self.__symbol_index(exchange)
+        if index is None:
             return
-        matches = []
-        for i in res:
-            sp = i.symbol.split(" ")
-            if sp[0] == symbol:
-                if i.expiry == expiry_date:
-                    matches.append(i)
-        for i in matches:
-            if is_fut == True:
-                if "FUT" in i.symbol:
-                    return i
-            else:
-                sp = i.symbol.split(" ")
-                if (sp[-1] == "CE") or (sp[-1] == "PE"):  # Only option scrips
-                    if float(sp[-2]) == float(strike):
-                        if is_call == True:
-                            if sp[-1] == "CE":
-                                return i
-                        else:
-                            if sp[-1] == "PE":
-                                return i
-
-    def search_instruments(self, exchange, symbol):
-        """Search instrument by symbol match"""
+        if is_fut:
+            return index.get(symbol, expiry_date)
+        return index.get(symbol, expiry_date, strike, "CE" if is_call else "PE")
+
+    def get_option_contracts(self, symbol, expiry_date, exchange="NFO"):
+        """[(strike, "CE" or "PE", instrument)] of an expiry sorted by strike"""
+        index = self.__symbol_index(exchange)
+        if index is None:
+            return []
+        return index.options(symbol, expiry_date)
+
+    def search_instruments(self, exchange, symbol, prefix=False):
+        """Search instrument by symbol match, substring by default"""
         # search instrument given exchange and symbol
+        index = self.__symbol_index(exchange)
+        if index is None:
+            return None
+        return index.search(symbol if isinstance(symbol, list) else [symbol], prefix)
+
+    def __symbol_index(self, exchange):
+        """search and F&O index of the exchange, built on first use"""
         exchange = exchange.upper()
-        matches = []
-        # print(self.__master_contracts_by_token)
-        # check if master contract exists
         if exchange not in self.__master_contracts_by_token:
             logger.warning(
                 f"Cannot find exchange {exchange} in master contract. "
                 "Please ensure if that exchange is enabled in your profile and downloaded the master contract for the same"
             )
             return None
-        master_contract = self.__master_contracts_by_token[exchange]
-        for contract in master_contract:
-            if isinstance(symbol, list):
-                for sym in symbol:
-                    if (
-                        sym.lower()
-                        in master_contract[contract].symbol.split(" ")[0].lower()
-                    ):
-                        matches.append(master_contract[contract])
-            else:
-                if (
-                    symbol.lower()
-                    in master_contract[contract].symbol.split(" ")[0].lower()
-                ):
-                    matches.append(master_contract[contract])
-        return matches
+        index = self.__symbol_indexes.get(exchange)
+        if index is None:
+            index = self.__symbol_indexes[exchange] = SymbolIndex(
+                self.__master_contracts_by_token[exchange]
+            )
+        return index
 
     def get_instrument_by_token(self, exchange, token):
         """Get instrument by providing token"""
@@ -1261,83 +1465,40 @@ class AlphaTrade(Connect):
         """Get master contract"""
         return self.__master_contracts_by_symbol[exchange]
 
-    def __get_master_contract(self, exchange):
-        """returns all the tradable contracts of an exchange
-        placed in an OrderedDict and the key is the token
+    def __get_master_contracts(self, exchanges):
+        """loads the token and symbol maps of the exchanges
+        from the master contract index in one go
         """
-        body = {}
-        with open(S_DATA + "Stocko_instruments.csv", "r") as file:
-            reader = csv.DictReader(file)
-            for index, row in enumerate(reader):  # Use `enumerate` to get the row index
-                sub = index  # Use the row index as `sub`
-                if sub not in body:
-                    body[sub] = []
-
-                    if row["exchange"] == exchange:
-                        body[sub].append(
-                            {
-                                "code": int(row["exchange_token"]),
-                                "symbol": row["trading_symbol"],
-                                "expiry": row["expiry"] if row["expiry"] else None,
-                                "lotSize": (
-                                    int(row["lot_size"]) if row["lot_size"] else 0
-                                ),
-                                "company": row["company_name"],
-                                "exchange": row["exchange"],
-                            }
-                        )
-                    else:
-                        pass
-                else:
-                    pass
-        master_contract_by_token = OrderedDict()
-        master_contract_by_symbol = OrderedDict()
-        for sub in body:
-            for scrip in body[sub]:
-                if scrip:
-                    token = int(scrip["code"])
-                    symbol = scrip["symbol"]
-                    if ("expiry" in scrip) and scrip["expiry"] != None:
-                        expiry = datetime.strptime(scrip["expiry"], "%d-%b-%Y").date()
-                    else:
-                        expiry = None
-                    lot_size = scrip["lotSize"] if ("lotSize" in scrip) else None
-                    name = scrip["company"]
-                    exch = scrip["exchange"]
-                    instrument = Instrument(exch, token, symbol, name, expiry, lot_size)
-                    master_contract_by_token[token] = instrument
-                    master_contract_by_symbol[symbol] = instrument
-                else:
-                    pass
-
-        self.__master_contracts_by_token[exchange] = master_contract_by_token
-        self.__master_contracts_by_symbol[exchange] = master_contract_by_symbol
-        print(f"Downloaded instruments for {exchange}")
+        contracts = load_master(S_DATA + MASTER_CSV, exchanges)
+        for exchange, (by_token, by_symbol) in contracts.items():
+            self.__master_contracts_by_token[exchange] = by_token
+            self.__master_contracts_by_symbol[exchange] = by_symbol
+            print(f"Downloaded instruments for {exchange}")
+        self.__instruments_by_code.clear()
 
     def __api_call_helper(self, name, http_method, params, data):
         # helper formats the url and reads error codes nicely
         config = self.__service_config
-        url = f"{config['host']}{config['routes'][name]}"
+        url = f"{self.__host}{config['routes'][name]}"
         if params is not None:
             url = url.format(**params)
-        response = self.__api_call(url, http_method, data)
+        response = self.__api_call(url, http_method, data, name)
         if response.status_code != 200:
             raise requests.HTTPError(response.text)
         return json.loads(response.text)
 
-    def __api_call(self, url, http_method, data):
+    def __api_call(self, url, http_method, data, name=None):
         # logger.debug('url:: %s http_method:: %s data:: %s headers:: %s', url, http_method, data, headers)
         r = None
         headers = self.__headers
         if http_method is Requests.POST:
-            # r = self.reqsession.post(url, data=json.dumps(data), headers=headers)
-            r = requests.post(url, data=json.dumps(data), headers=headers)
+            r = self.http.post(url, data=json.dumps(data), headers=headers, metric=name)
         elif http_method is Requests.DELETE:
-            r = requests.delete(url, headers=headers)
+            r = self.http.delete(url, headers=headers, metric=name)
         elif http_method is Requests.PUT:
-            r = requests.put(url, data=json.dumps(data), headers=headers)
+            r = self.http.put(url, data=json.dumps(data), headers=headers, metric=name)
         elif http_method is Requests.GET:
-            r = requests.get(url, headers=headers)
+            r = self.http.get(url, headers=headers, metric=name)
         return r
 
     def get_candles(
@@ -1373,10 +1534,11 @@ class AlphaTrade(Connect):
             "starttime": start_time,
             "endtime": end_time,
         }
-        r = requests.get(
-            "https://web.stocko.in/api/v1/charts/tdv",
+        r = self.http.get(
+            f"{self.__web_host}/api/v1/charts/tdv",
             params=params_tv,
             headers=self.__headers,
+            metric="get_candles",
         )
         data = r.json()
         return self.__format_candles(data, divider)  #
@@ -1432,7 +1594,7 @@ class AlphaTrade(Connect):
 
     def check_masters(self):
         ############ downloading instrument file if yesterdays
-        file_path = S_DATA + "stocko_instruments.csv"
+        file_path = S_DATA + MASTER_CSV
         # Get the current date
         current_date = datetime.now().date()
         # Check if the file exists
@@ -1451,15 +1613,15 @@ class AlphaTrade(Connect):
             self.download_master()
 
     def download_master(self):
-        url = "https://web.stocko.in/api/v1/contract/Compact?info=download"
-        destination_folder = Path("../data")
+        url = f"{self.__web_host}/api/v1/contract/Compact?info=download"
+        destination_folder = Path(S_DATA)
         zip_file_name = "Stocko_instruments.zip"
         zip_file_path = destination_folder / zip_file_name
-        renamed_csv_file_name = "Stocko_instruments.csv"
+        renamed_csv_file_name = MASTER_CSV
         renamed_csv_file_path = destination_folder / renamed_csv_file_name
 
         destination_folder.mkdir(parents=True, exist_ok=True)
-        response = requests.get(url, stream=True)
+        response = self.http.get(url, stream=True, timeout=None)
 
         if response.status_code == 200:
             with open(zip_file_path, "wb") as file:
@@ -1484,7 +1646,9 @@ class AlphaTrade(Connect):
                 print("The downloaded file is not a valid zip file.")
 
             if bl_extracted:
-                zip_file_path.unlink
+                zip_file_path.unlink()
+                # the only place the index is rebuilt from a new file
+                build_index(str(renamed_csv_file_path))
         else:
             print(
                 f"Failed to download the file. HTTP Status Code: {response.status_code}"
@@ -0,0 +1,167 @@
+"""
+Websocket subscription manager.
+
+subscribe/unsubscribe requests are collected for a short window
+and then sent as a few frames, one per action and feed mode, split
+into chunks the server accepts. Requests that would not change
+anything are dropped, and the time from a subscribe request to the
+first tick of the instrument is recorded.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from stocko.session import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionManager:
+    """
+    Coalesces subscriptions of (exchange code, token) pairs per feed mode
+
+    Parameters
+    ----------
+    send : callable
+        sends one text frame, AlphaTrade.__ws_send
+    window : float
+        seconds requests are collected before they are sent
+    chunk_size : int
+        most instruments in one frame
+    autoflush : bool
+        flush from a background thread, without it the owner
+        sends the frames of drain() itself, like AsyncFeed
+    """
+
+    def __init__(
+        self, send, window: float = 0.02, chunk_size: int = 100, autoflush=True
+    ):
+        self.send = send
+        self.autoflush = autoflush
+        self.window = window
+        self.chunk_size = chunk_size
+        self.metrics = LatencyStats()
+        # {(exchange, token): seconds} from subscribe to the first tick
+        self.first_tick = {}
+        self.__subscribed = set()
+        # {(exchange, token, mode): "subscribe" or "unsubscribe"}
+        self.__pending = {}
+        self.__awaiting = {}
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__thread = None
+
+    @property
+    def subscribed(self):
+        """(exchange, token, mode) of everything sent and not unsubscribed"""
+        with self.__lock:
+            return set(self.__subscribed)
+
+    def subscribe(self, pairs, mode):
+        now = time.perf_counter()
+        with self.__lock:
+            for exchange, token in pairs:
+                key = (exchange, token, mode)
+                if self.__pending.get(key) == "unsubscribe":
+                    # still subscribed on the server
+                    del self.__pending[key]
+                elif key not in self.__subscribed:
+                    self.__pending[key] = "subscribe"
+                    self.__awaiting.setdefault((exchange, token), now)
+        self.__schedule()
+
+    def unsubscribe(self, pairs, mode):
+        with self.__lock:
+            for exchange, token in pairs:
+                key = (exchange, token, mode)
+                if self.__pending.get(key) == "subscribe":
+                    # never reached the server
+                    del self.__pending[key]
+                    self.__awaiting.pop((exchange, token), None)
+                elif key in self.__subscribed:
+                    self.__pending[key] = "unsubscribe"
+        self.__schedule()
+
+    def resync(self):
+        """sends every subscription again, after a reconnect"""
+        with self.__lock:
+            for key in self.__subscribed:
+                self.__pending.setdefault(key, "subscribe")
+            self.__subscribed.clear()
+        self.__schedule()
+
+    def on_tick(self, exchange, token):
+        """called with every tick, records the first one after a subscribe"""
+        if self.__awaiting:
+            requested = self.__awaiting.pop((exchange, token), None)
+            if requested is not None:
+                latency = time.perf_counter() - requested
+                self.first_tick[(exchange, token)] = latency
+                self.metrics.record("first_tick", latency)
+
+    def frames(self, batch):
+        """json frames of a {(exchange, token, mode): action} batch"""
+        groups = {}
+        for (exchange, token, mode), action in batch.items():
+            groups.setdefault((action, mode), []).append([exchange, token])
+        return [
+            json.dumps({"a": action, "v": pairs[i : i + self.chunk_size], "m": mode})
+            for (action, mode), pairs in groups.items()
+            for i in range(0, len(pairs), self.chunk_size)
+        ]
+
+    def drain(self):
+        """takes everything pending as if it was sent, returns (batch, frames)"""
+        with self.__lock:
+            batch, self.__pending = self.__pending, {}
+            for key, action in batch.items():
+                if action == "subscribe":
+                    self.__subscribed.add(key)
+                else:
+                    self.__subscribed.discard(key)
+        return batch, self.frames(batch)
+
+    def flush(self):
+        """sends whatever is pending right away"""
+        batch, frames = self.drain()
+        try:
+            for frame in frames:
+                self.send(frame)
+        except Exception:
+            # put the batch back, resending a frame that did go out is harmless
+            with self.__lock:
+                for key, action in batch.items():
+                    if key not in self.__pending:
+                        self.__pending[key] = action
+                        if action == "subscribe":
+                            self.__subscribed.discard(key)
+                        else:
+                            self.__subscribed.add(key)
+            raise
+
+    def __schedule(self):
+        if not self.autoflush:
+            return
+        if self.__thread is None:
+            with self.__lock:
+                if self.__thread is None:
+                    self.__thread = threading.Thread(
+                        target=self.__run, name="subscriptions", daemon=True
+                    )
+                    self.__thread.start()
+        self.__wakeup.set()
+
+    def __run(self):
+        while True:
+            self.__wakeup.wait()
+            # let the requests of the same burst pile up
+            time.sleep(self.window)
+            self.__wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"subscription flush failed, retrying, {e}")
+                time.sleep(1)
+                self.__wakeup.set()
@@ -4,7 +4,7 @@ import json
 import time
 from struct import pack_into
 import ctypes, struct
-from .packetDecoder import decodeDetailedMarketData, decodeCompactMarketData, decodeSnapquoteData, decodeOrderUpdate
+from .decoders import decodeDetailedMarketData, decodeCompactMarketData, decodeSnapquoteData, decodeOrderUpdate
 
 login_id = ""
 access_token = ""
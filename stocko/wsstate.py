@@ -0,0 +1,60 @@
+"""
+Websocket connection state.
+
+Threads that need an open socket block on an event instead of
+polling a flag, and the time taken by the first connect and by
+every reconnect is kept in LatencyStats.
+"""
+
+import threading
+import time
+
+from stocko.session import LatencyStats
+
+
+class ConnectionState:
+    """
+    Open/closed state of one websocket
+
+    connecting() is called before every connection attempt, opened()
+    and closed() from the socket callbacks. wait() blocks until the
+    socket is open without burning cpu.
+    """
+
+    def __init__(self):
+        self.metrics = LatencyStats()
+        self.connects = 0
+        self.disconnects = 0
+        self.opened_at = None
+        self.closed_at = None
+        self._started_at = None
+        self._open = threading.Event()
+
+    @property
+    def is_open(self):
+        return self._open.is_set()
+
+    def connecting(self):
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+
+    def opened(self):
+        now = time.perf_counter()
+        if self.connects == 0:
+            if self._started_at is not None:
+                self.metrics.record("connect", now - self._started_at)
+        elif self.closed_at is not None:
+            self.metrics.record("reconnect", now - self.closed_at)
+        self.connects += 1
+        self.opened_at = now
+        self._open.set()
+
+    def closed(self):
+        if self.is_open:
+            self.disconnects += 1
+            self.closed_at = time.perf_counter()
+        self._open.clear()
+
+    def wait(self, timeout=None):
+        """True once the socket is open, False if timeout seconds pass first"""
+        return self._open.wait(timeout)
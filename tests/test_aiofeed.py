@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+import websockets
+
+from stocko.aiofeed import AsyncFeed
+
+
+def test_subscribe_before_run_is_sent_on_connect():
+    feed = AsyncFeed("ws://unused", backoff=(0.01, 0.01))
+    # no loop is running yet
+    feed.subscribe([(1, 26000)], 1)
+    assert feed._flushing is None
+
+    async def main():
+        received = asyncio.Queue()
+
+        async def handler(ws):
+            async for message in ws:
+                await received.put(message)
+
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            feed.url = f"ws://127.0.0.1:{port}"
+            task = asyncio.create_task(feed.run())
+            message = await asyncio.wait_for(received.get(), 5)
+            await feed.close()
+            await asyncio.wait_for(task, 5)
+        return message
+
+    frame = json.loads(asyncio.run(main()))
+    assert frame["a"] == "subscribe"
+    assert [1, 26000] in frame["v"]
@@ -0,0 +1,51 @@
+import pytest
+
+from stocko.mockbroker import MockBroker
+
+
+@pytest.fixture
+def broker():
+    # handle() is called directly, no server needed
+    return MockBroker(port=0)
+
+
+def bracket(broker):
+    status, response = broker.handle(
+        "POST",
+        "/api/v1/orders/bracket",
+        {},
+        {"order_type": "LIMIT", "price": 100.0, "quantity": 75},
+    )
+    assert status == 200
+    return response["data"]["oms_order_id"]
+
+
+def status_of(broker, oms_order_id):
+    return broker.orders[oms_order_id]["order_status"]
+
+
+def test_exit_without_order_id_is_rejected(broker):
+    first = bracket(broker)
+    status, response = broker.handle("DELETE", "/v1/orders/bracket", {}, None)
+    assert status == 400
+    assert response["status"] == "error"
+    assert status_of(broker, first) == "open"
+
+
+def test_exit_cancels_the_named_order_only(broker):
+    first, second = bracket(broker), bracket(broker)
+    status, _ = broker.handle(
+        "DELETE", "/v1/orders/bracket", {"oms_order_id": [first]}, None
+    )
+    assert status == 200
+    assert status_of(broker, first) == "cancelled"
+    assert status_of(broker, second) == "open"
+
+
+def test_exit_of_another_product_is_rejected(broker):
+    first = bracket(broker)
+    status, _ = broker.handle(
+        "DELETE", "/v1/orders/cover", {"oms_order_id": [first]}, None
+    )
+    assert status == 400
+    assert status_of(broker, first) == "open"
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from renko import RenkoAtr
+
+
+def history(n=120, seed=5):
+    """finvasia-like 5 minute candles, prices as strings"""
+    rng = np.random.default_rng(seed)
+    close = np.round(22000 + np.cumsum(rng.normal(0, 15, n)), 2)
+    open = np.round(np.r_[close[0], close[:-1]], 2)
+    high = np.round(np.maximum(open, close) + rng.uniform(0, 10, n), 2)
+    low = np.round(np.minimum(open, close) - rng.uniform(0, 10, n), 2)
+    return pd.DataFrame(
+        dict(
+            timestamp=pd.date_range("2025-04-01 09:15", periods=n, freq="5min"),
+            open=open.astype(str),
+            high=high.astype(str),
+            low=low.astype(str),
+            close=close.astype(str),
+        )
+    )
+
+
+def test_seed_reads_string_prices():
+    df = history()
+    assert not pd.api.types.is_numeric_dtype(df["close"])
+    from_strings = RenkoAtr(11).seed(df.itertuples(index=False, name=None))
+    numbers = df.astype({c: float for c in ["open", "high", "low", "close"]})
+    from_floats = RenkoAtr(11).seed(numbers.itertuples(index=False, name=None))
+    assert from_strings
+    assert from_strings == from_floats
+
+
+def test_seed_from_strings_matches_get_renko_atr():
+    indicators = pytest.importorskip("stock_indicators")
+    df = history()
+    quotes = [
+        indicators.Quote(
+            date=row.timestamp,
+            open=Decimal(row.open),
+            high=Decimal(row.high),
+            low=Decimal(row.low),
+            close=Decimal(row.close),
+        )
+        for row in df.itertuples()
+    ]
+    expected = [
+        (float(r.open), float(r.close))
+        for r in indicators.indicators.get_renko_atr(quotes, 11)
+    ]
+    bricks = RenkoAtr(11).seed(df.itertuples(index=False, name=None))
+    assert [(b.open, b.close) for b in bricks] == pytest.approx(expected)
@@ -0,0 +1,162 @@
+import socket
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+
+from stocko import exceptions as ex
+from stocko.masters import Instrument
+from stocko.mockbroker import MockBroker
+from stocko.orders import never_sent
+from stocko.stockoapi import AlphaTrade, OrderType, ProductType, TransactionType
+
+INSTRUMENT = Instrument("NFO", 1, "MOCK1CE", "MOCK", None, 75)
+
+
+def alpha(base_url, timeout=(3.05, 2)):
+    return AlphaTrade(
+        "u",
+        "p",
+        "t",
+        "s",
+        access_token="tok",
+        master_contracts_to_download=[],
+        base_url=base_url,
+        timeout=timeout,
+    )
+
+
+def legs(count=2):
+    return [
+        dict(
+            instrument=INSTRUMENT,
+            order_type=OrderType.Market,
+            quantity=75,
+            transaction_type=TransactionType.Buy,
+            product_type=ProductType.Intraday,
+        )
+        for _ in range(count)
+    ]
+
+
+class DroppingServer:
+    """reads every request in full, then closes the socket unanswered"""
+
+    def __init__(self):
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self.sock.getsockname()[1]}"
+        self.requests = []
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                data = b""
+                while b"\r\n\r\n" not in data:
+                    data += conn.recv(65536)
+                head, _, body = data.partition(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                while len(body) < length:
+                    body += conn.recv(65536)
+                self.requests.append(head.split(b"\r\n")[0])
+
+    def close(self):
+        self.sock.close()
+
+
+def closed_port():
+    with socket.create_server(("127.0.0.1", 0)) as sock:
+        return sock.getsockname()[1]
+
+
+def test_never_sent():
+    assert never_sent(requests.ConnectTimeout())
+    assert not never_sent(requests.ReadTimeout())
+    assert not never_sent(requests.ConnectionError("Connection aborted."))
+    assert not never_sent(requests.HTTPError("503"))
+
+
+def test_basket_dropped_after_sending_is_not_resent():
+    server = DroppingServer()
+    try:
+        api = alpha(server.url)
+        with pytest.raises(ex.OrderException, match="outcome unknown"):
+            api.place_basket_order(legs())
+        # the basket went out once and no leg followed it
+        assert server.requests == [b"POST /api/v2/basketorder HTTP/1.1"]
+    finally:
+        server.close()
+
+
+def test_basket_falls_back_when_the_broker_is_unreachable():
+    api = alpha(f"http://127.0.0.1:{closed_port()}")
+    results = api.place_basket_order(legs())
+    assert len(results) == 2
+    assert all(never_sent(result.error) for result in results)
+
+
+def test_basket_without_fallback_raises_the_connection_error():
+    api = alpha(f"http://127.0.0.1:{closed_port()}")
+    with pytest.raises(requests.ConnectionError):
+        api.place_basket_order(legs(), fallback=False)
+
+
+@pytest.fixture
+def broker():
+    broker = MockBroker(port=0)
+    broker.start()
+    yield broker
+    broker.stop()
+
+
+def place(api, product_type, **kwargs):
+    response = api.place_order(
+        INSTRUMENT,
+        OrderType.StopLossLimit,
+        75,
+        product_type,
+        TransactionType.Buy,
+        price=100.0,
+        trigger_price=99.0,
+        **kwargs,
+    )
+    return response["data"]["oms_order_id"]
+
+
+def test_cancel_all_orders_exits_bracket_and_cover_orders_by_id(broker):
+    api = alpha(f"http://127.0.0.1:{broker.port}")
+    bracket = [
+        place(api, ProductType.BracketOrder, stop_loss=5.0, square_off=5.0)
+        for _ in range(2)
+    ]
+    cover = place(api, ProductType.CoverOrder)
+    sent = []
+    delete = api.http.delete
+
+    def recording(url, **kwargs):
+        sent.append(urlsplit(url))
+        return delete(url, **kwargs)
+
+    api.http.delete = recording
+    results = api.cancel_all_orders()
+
+    assert len(results) == 3
+    exits = {
+        (url.path, parse_qs(url.query)["oms_order_id"][0])
+        for url in sent
+        if url.path.startswith("/v1/orders/")
+    }
+    assert exits == {
+        ("/v1/orders/bracket", bracket[0]),
+        ("/v1/orders/bracket", bracket[1]),
+        ("/v1/orders/cover", cover),
+    }
+    assert not api.get_orderbook(pending=True)["data"]["pending_orders"]